@@ -0,0 +1,92 @@
+"""
+ Micro benchmark of EntsoeAPI.parse_table_data, fast parser against the
+ reference BeautifulSoup parser.
+
+ getDataTableData/ pages are rebuilt from the table of a recorded session
+ in data/, repeated up to --rows rows.
+
+ usage: python benchmarks/bench_parse_table_data.py [--rows 100000]
+"""
+
+import argparse
+import os
+import sys
+import zipfile
+from timeit import default_timer as timer
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from entsoe_client import EntsoeAPI  # noqa: E402
+
+ARCHIVE = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "data",
+    "SK_BORDER_BZN_01_01_2018_01_01_2020.zip",
+)
+
+STATUS = {"Active": "A05", "Cancelled": "A09", "Withdrawn": "A13"}
+NATURE = {"Planned": "A53", "Forced": "A54"}
+
+
+def load_fixture(rows):
+    """
+    returns a getDataTableData/ response with rows table rows
+    """
+    name = os.path.basename(ARCHIVE)[:-4]
+    with zipfile.ZipFile(ARCHIVE) as archive:
+        with archive.open(f"{name}/{name}.csv") as fp:
+            df = pd.read_csv(fp, dtype=str)
+
+    aa_data = []
+    for row in df.itertuples():
+        ntc = str(row.newNTC)
+        if "(VARY)" in ntc:
+            ntc = ntc.replace("(VARY)", '<span class="vary">(VARY)</span>')
+        aa_data.append(
+            [
+                STATUS.get(row.status, row.status),
+                NATURE.get(row.nature, row.nature),
+                f"{row.unavailabilityStart}&nbsp;-&nbsp;"
+                f"{row.unavailabilityEnd} (CET)",
+                row.inArea,
+                row.outArea,
+                ntc,
+                row.detailId,
+            ]
+        )
+
+    aa_data = (aa_data * (rows // len(aa_data) + 1))[:rows]
+    return {"iTotalRecords": len(aa_data), "aaData": aa_data}
+
+
+def bench(json_data, fast, repeat):
+    best = None
+    for _ in range(repeat):
+        t_start = timer()
+        data = EntsoeAPI.parse_table_data(json_data, fast=fast)
+        elapsed = timer() - t_start
+        best = elapsed if best is None else min(best, elapsed)
+    return data, best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    json_data = load_fixture(args.rows)
+
+    reference, t_reference = bench(json_data, False, args.repeat)
+    fast, t_fast = bench(json_data, True, args.repeat)
+
+    if fast != reference:
+        sys.exit("fast parser output differs from reference parser")
+
+    print(f"rows: {args.rows}")
+    print(f"reference (BeautifulSoup): {t_reference:.3f} s")
+    print(f"fast                     : {t_fast:.3f} s")
+    print(f"speedup                  : {t_reference / t_fast:.1f}x")
@@ -1,2 +1,13 @@
+from .cache import ResponseCache
+from .cube import NtcCube
 from .entsoe import EntsoeAPI
 from .exceptions import *
+from .intervals import IntervalIndex
+from .journal import SessionJournal
+from .output import CsvOutput, DedupCsvOutput, ParquetOutput, RleOutput
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .rle import RleCurve
+from .store import OutageStore
+from .workqueue import WorkQueue
+from .writer import AsyncWriter
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from .output import _replace
+
+
+class ResponseCache(object):
+    """
+    Content addressed on disk cache for api responses
+
+    Responses are stored under the sha256 of endpoint plus normalized params
+    and body, entries older than ttl seconds are ignored and the least
+    recently used entries are evicted once the cache grows past max_size
+    bytes
+    """
+
+    def __init__(self, cache_dir, ttl=None, max_size=2 << 30, ignore=("_",)):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+        self.ignore = set(ignore)  # params that don't change the response
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.__size = sum(os.path.getsize(p) for p in self.__entries())
+
+    def key(self, method, params=(), data=None):
+        """
+        Returns the cache key of a request, params order and ignored params
+        (the "_" cache busting timestamp) don't change the key
+        """
+        params = sorted(
+            [(k, v) for k, v in params if k not in self.ignore],
+            key=lambda param: param[0],
+        )
+        payload = json.dumps(
+            [method, params, data], sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def __path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def __entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for f in files:
+                if not f.endswith(".tmp"):
+                    yield os.path.join(root, f)
+
+    def get(self, key):
+        """
+        Returns the cached response text or None
+        """
+        path = self.__path(key)
+        try:
+            stat = os.stat(path)
+            if self.ttl is not None and time.time() - stat.st_mtime > self.ttl:
+                with self.__lock:
+                    self.misses += 1
+                return None
+            with open(path, "r", encoding="utf-8") as fp:
+                text = fp.read()
+            if not text:
+                # entry lost before it reached the disk, never a response
+                raise OSError(f"empty cache entry {path}")
+            # access time drives lru eviction, mtime keeps the ttl
+            os.utime(path, (time.time(), stat.st_mtime))
+        except OSError:
+            with self.__lock:
+                self.misses += 1
+            return None
+
+        with self.__lock:
+            self.hits += 1
+        return text
+
+    def set(self, key, text):
+        """
+        Stores a response text
+        """
+        path = self.__path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fp:
+            fp.write(text)
+        _replace(tmp, path)  # readers never see half written entries
+
+        with self.__lock:
+            self.__size += os.path.getsize(path) - old_size
+            evict = self.__size > self.max_size
+        if evict:
+            self.__evict()
+
+    def __evict(self):
+        """
+        Deletes least recently used entries until the cache fits in 90% of
+        max_size
+        """
+        with self.__lock:
+            entries = []
+            for path in self.__entries():
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+            entries.sort()
+
+            size = sum(e[1] for e in entries)
+            removed = 0
+            for _, entry_size, path in entries:
+                if size <= 0.9 * self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                size -= entry_size
+                removed += 1
+            self.__size = size
+        logging.info(f"response cache evicted {removed} entries")
@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from .entsoe import EntsoeAPI
+
+HOUR = 3600 * 10**9  # ns
+
+
+class NtcCube(object):
+    """
+    Reduced NTC per border per hour across every outage, the minimum NTC of
+    the curves covering that hour, NaN where no outage is known
+
+        {path}.{generation}.npy : float32 [border, hour - start_hour]
+        {path}.json             : borders, start_hour, generation and the
+                                  detailIds already folded
+
+    The array is memory mapped, a border over years is a zero copy slice.
+    Curves are folded in as they arrive, folding a curve twice doesn't
+    change the cube. The array grows into a new generation file and the
+    index is replaced after it, a crash leaves the previous cube intact
+    """
+
+    def __init__(self, path, grow_hours=24 * 366):
+        self.path = path
+        self.grow_hours = grow_hours
+        self.borders = []
+        self.start_hour = 0
+        self.generation = 0
+        self.folded = set()
+        self.array = None
+        self.__rows = {}
+
+        try:
+            with open(f"{path}.json", "r", encoding="utf-8") as fp:
+                index = json.load(fp)
+        except FileNotFoundError:
+            return
+        self.borders = index["borders"]
+        self.start_hour = index["start_hour"]
+        self.generation = index["generation"]
+        self.folded = set(index["folded"])
+        self.__rows = {border: n for n, border in enumerate(self.borders)}
+        self.array = np.load(self.__npy(self.generation), mmap_mode="r+")
+
+    def __npy(self, generation):
+        return f"{self.path}.{generation}.npy"
+
+    def __grow(self, borders, first_hour, last_hour):
+        """
+        Makes room for borders and hours [first_hour, last_hour]
+        """
+        new_borders = [
+            border
+            for border in dict.fromkeys(borders)
+            if border not in self.__rows
+        ]
+        if self.array is not None:
+            start = self.start_hour
+            stop = start + self.array.shape[1]
+            if not new_borders and start <= first_hour and last_hour < stop:
+                return
+            first_hour = min(first_hour, start)
+            last_hour = max(last_hour, stop - 1)
+
+        # grow by whole blocks, not every new curve needs a new file
+        first_hour -= first_hour % self.grow_hours
+        last_hour += self.grow_hours - last_hour % self.grow_hours - 1
+        shape = (
+            len(self.borders) + len(new_borders),
+            last_hour - first_hour + 1,
+        )
+        generation = self.generation + 1
+        array = np.lib.format.open_memmap(
+            self.__npy(generation), mode="w+", dtype="float32", shape=shape
+        )
+        array[:] = np.nan
+        if self.array is not None:
+            offset = self.start_hour - first_hour
+            old = self.array
+            array[: old.shape[0], offset : offset + old.shape[1]] = old
+        array.flush()
+        logging.info(f"ntc cube {self.path} grown to {shape}")
+
+        previous = self.generation if self.array is not None else None
+        self.array = array
+        self.generation = generation
+        self.start_hour = first_hour
+        for border in new_borders:
+            self.__rows[border] = len(self.borders)
+            self.borders.append(border)
+        self.save()
+        if previous is not None:
+            os.remove(self.__npy(previous))
+
+    @staticmethod
+    def __ns(dates):
+        """
+        UTC nanoseconds of dates, tz aware columns are only cast
+        """
+        if isinstance(dates.dtype, pd.DatetimeTZDtype):
+            dates = dates.astype("datetime64[ns, UTC]")
+        else:
+            dates = EntsoeAPI.to_utc(dates)
+        return dates.values.astype("int64")
+
+    def fold(self, detail_id, border, df, save=True):
+        """
+        Folds the curve of detail_id, a curve_to_df dataframe, into the
+        hours of border. save=False leaves saving the index to the caller
+        when folding many curves
+        """
+        detail_id = str(detail_id)
+        if detail_id in self.folded or df.empty:
+            self.folded.add(detail_id)
+            if save:
+                self.save()
+            return
+
+        starts = self.__ns(df["interval start"])
+        ends = self.__ns(df["interval end"])
+        ntc = pd.to_numeric(df["newNTC"], errors="coerce").to_numpy("float32")
+
+        # an interval covers every hour it touches
+        first = starts // HOUR
+        count = np.maximum(-(-ends // HOUR) - first, 1)
+        hours = np.repeat(first, count) + (
+            np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        )
+        ntc = np.repeat(ntc, count)
+
+        self.__grow([border], int(hours.min()), int(hours.max()))
+        row = self.array[self.__rows[border]]
+        np.fmin.at(row, hours - self.start_hour, ntc)  # NaN means no outage
+        self.folded.add(detail_id)
+        if save:
+            self.save()
+
+    def fold_output(self, table, output):
+        """
+        Folds the curves of the outages of a session table that aren't
+        folded yet, read at once through output.iter_curves (CsvOutput,
+        ParquetOutput, OutageStore, ...). Returns how many
+        """
+        table = table.drop_duplicates("detailId")
+        table = table[~table["detailId"].astype(str).isin(self.folded)]
+        if table.empty:
+            return 0
+        in_area = table["inArea"].astype(str)
+        out_area = table["outArea"].astype(str)
+        borders = dict(
+            zip(table["detailId"].astype(str), in_area + "-" + out_area)
+        )
+        self.__presize(table, borders)
+
+        folded = 0
+        for detail_id, df in output.iter_curves(list(borders)):
+            if not pd.api.types.is_datetime64_any_dtype(df["interval start"]):
+                df = df.copy()
+                for column in ("interval start", "interval end"):
+                    # curves written before the utc columns are CET
+                    df[column] = EntsoeAPI.to_utc(df[column], "CET").values
+            self.fold(detail_id, borders[str(detail_id)], df, save=False)
+            folded += 1
+        self.save()
+        return folded
+
+    def __presize(self, table, borders):
+        """
+        Grows the cube once for the borders and outage hours of table
+        instead of once per new border while folding
+        """
+        columns = ["unavailabilityStartUTC", "unavailabilityEndUTC"]
+        if not all(column in table for column in columns):
+            return
+        start = EntsoeAPI.to_utc(table[columns[0]]).min()
+        end = EntsoeAPI.to_utc(table[columns[1]]).max()
+        if pd.isna(start) or pd.isna(end):
+            return
+        self.__grow(
+            list(borders.values()), start.value // HOUR, -(-end.value // HOUR)
+        )
+
+    def save(self):
+        """
+        Flushes the array and replaces the index
+        """
+        if self.array is not None:
+            self.array.flush()
+        index = {
+            "borders": self.borders,
+            "start_hour": self.start_hour,
+            "generation": self.generation,
+            "folded": sorted(self.folded),
+        }
+        tmp = f"{self.path}.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(index, fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, f"{self.path}.json")
+
+    def hour(self, time):
+        """
+        Column of time in the array
+        """
+        time = pd.Timestamp(time)
+        if time.tzinfo is None:
+            time = time.tz_localize("UTC")
+        return time.value // HOUR - self.start_hour
+
+    def series(self, border, start=None, end=None):
+        """
+        Hourly reduced NTC of border from start up to end, a view of the
+        array indexed by UTC hour
+        """
+        row = self.array[self.__rows[border]]
+        lo = 0 if start is None else max(self.hour(start), 0)
+        hi = row.shape[0] if end is None else self.hour(end)
+        hi = min(max(hi, lo), row.shape[0])
+        index = pd.to_datetime(
+            (np.arange(lo, hi) + self.start_hour) * HOUR, utc=True
+        )
+        return pd.Series(row[lo:hi], index=index, name=border, copy=False)
@@ -1,4 +1,7 @@
 import datetime
+import functools
+import hashlib
+import itertools
 import json
 import logging
 import time
@@ -6,15 +9,24 @@ import pprint
 import os
 from timeit import default_timer as timer
 import random
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
+import numpy as np
 import pandas as pd
 import pytz
 import requests
 from bs4 import BeautifulSoup
+from lxml import etree
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 from .exceptions import *
+from .journal import CurveCheckpoint
+from .output import CsvOutput, _replace
+from .pipeline import ParsePipeline
+from .ratelimit import RateLimiter
 from .user_agents import user_agents
 
 
@@ -57,6 +69,41 @@ class EntsoeAPI(object):
 
     __outage_status = {"Active": "A05", "Cancelled": "A09", "Withdrawn": "A13"}
 
+    # code -> name lookups of parse_table_data, order is the order codes are
+    # searched for when a value isn't just the code
+    __status_codes = {"A05": "Active", "A09": "Cancelled", "A13": "Withdrawn"}
+    __nature_codes = {"A53": "Planned", "A54": "Forced"}
+
+    # asset type class of affected assets table cells, see parse_detail_html
+    __asset_codes = {
+        "B21": "AC Link",
+        "B22": "DC Link",
+        "B23": "Substation",
+        "B24": "Transformer",
+        "UNKNOWN": "Not specified",
+    }
+
+    # text of an element the way BeautifulSoup .text sees it, comments and
+    # script / style contents are not text
+    __element_strings = etree.XPath(
+        ".//text()[not(ancestor::script or ancestor::style "
+        "or ancestor::template)]"
+    )
+
+    # html fragments without tags, entities or leading whitespace are
+    # returned as is by the html parser
+    __plain_text = re.compile(r"[^<&\s][^<&\r\x00]*\Z")
+
+    # summer time abbreviations shown in intervals that aren't tz names
+    __dst_abbreviations = {
+        "WEST": "Etc/GMT-1",
+        "BST": "Etc/GMT-1",
+        "IST": "Etc/GMT-1",
+        "CEST": "Etc/GMT-2",
+        "EEST": "Etc/GMT-3",
+        "MSK": "Europe/Moscow",
+    }
+
     __countries = [
         "AL",
         "AT",
@@ -716,43 +763,146 @@ class EntsoeAPI(object):
 
     __pagination = [10, 25, 50, 100]
 
+    # historical outages rarely change, safe to serve from ResponseCache
+    __cacheable = ("detail", "getDetailCurve/")
+
     def __init__(
         self,
         items_per_page=100,
         connection=5,
         backoff_factor=0.5,
         conn_rst_int=300,
-        pause_req=100,
-        pause_int=30,
         req_delay=3,
+        workers=1,
+        rate_limiter=None,
+        cache=None,
+        retry_policy=None,
+        parse_workers=0,
     ):
         self.connection = connection
         self.backoff_factor = backoff_factor
         self.conn_rst_int = conn_rst_int
-        self.pause_req = pause_req
-        self.pause_int = pause_int
         self.req_delay = req_delay
         if items_per_page not in self.__pagination:
             raise RuntimeError("item_per_page domain is (10, 25, 50, 100)")
         self.items_per_page = items_per_page
+        if workers < 1:
+            raise RuntimeError("workers must be at least 1")
+        self.workers = workers
+        if rate_limiter is None:
+            # one request every req_delay seconds, like the old fixed sleeps
+            rate = 1.0 / req_delay if req_delay else 1e6
+            rate_limiter = RateLimiter(rate=rate)
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.retry_policy = retry_policy
+        self.parse_workers = parse_workers
         self.requests_num = 0
-        self.session = self.__renew_session()
-        self.s_time = timer()
+        self.__local = threading.local()
+        self.__sessions = []
+        self.__lock = threading.Lock()
+        self.__executor = None
+        self.__renew_session()
+
+    @property
+    def session(self):
+        """
+        Returns the requests session of the calling thread, every worker
+        thread gets its own pooled connection
+        """
+        if getattr(self.__local, "session", None) is None:
+            self.__renew_session()
+        return self.__local.session
 
     def __renew_session(self):
-        if hasattr(self, "property"):
-            self.session.close()
-            self.session = None
-        self.session = requests.Session()
+        session = getattr(self.__local, "session", None)
+        if session is not None:
+            session.close()
+            with self.__lock:
+                self.__sessions.remove(session)
+        session = requests.Session()
         retry = Retry(
             connect=self.connection, backoff_factor=self.backoff_factor
         )
         adapter = HTTPAdapter(max_retries=retry)
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
         self.__post_headers.update({"User-Agent": random.choice(user_agents)})
         self.__get_headers.update({"User-Agent": random.choice(user_agents)})
-        return self.session
+        with self.__lock:
+            self.__sessions.append(session)
+        self.__local.session = session
+        self.__local.s_time = timer()
+        return session
+
+    def __fetch_parse(self, fetch, parse, iterable, name):
+        """
+        Yields parse(fetch(item)) for every item of iterable in order. With
+        parse_workers fetching runs on the worker threads and parsing on a
+        process pool, parse must be a staticmethod then
+        """
+        if self.parse_workers > 0:
+            pipeline = ParsePipeline(
+                self.workers, self.parse_workers, io_pool=self.__pool()
+            )
+            return pipeline.map(fetch, parse, iterable, name=name)
+        return self.__map(lambda item: parse(fetch(item)), iterable)
+
+    def __pool(self):
+        """
+        Returns the worker threads of the client, created once and kept
+        until close() so every thread opens a single requests session
+        """
+        with self.__lock:
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="entsoe"
+                )
+            return self.__executor
+
+    def __map(self, func, iterable, ordered=True):
+        """
+        Maps func over iterable on the worker threads, results are yielded
+        in the same order as iterable. ordered=False yields results as they
+        complete and only takes the next item of iterable once a thread is
+        free, iterable may be an endless stream
+        """
+        if self.workers == 1:
+            for item in iterable:
+                yield func(item)
+            return
+        if not ordered:
+            yield from self.__map_unordered(func, iterable)
+            return
+
+        futures = [self.__pool().submit(func, item) for item in iterable]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            # don't keep downloading when the caller bails out on error
+            for future in futures:
+                future.cancel()
+            wait(futures)
+
+    def __map_unordered(self, func, iterable):
+        pool = self.__pool()
+        running = set()
+        try:
+            for item in iterable:
+                running.add(pool.submit(func, item))
+                if len(running) < self.workers:
+                    continue
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            for future in list(running):
+                running.discard(future)
+                yield future.result()
+        finally:
+            for future in running:
+                future.cancel()
+            wait(running)
 
     def __post(self, url, params, data):
         """
@@ -787,7 +937,7 @@ class EntsoeAPI(object):
                         error_data["errors"][0]["message"]
                     ) from None
         else:
-            return json.loads(response.text)
+            return response.text
 
     def __get(self, url, params):
         """
@@ -806,45 +956,105 @@ class EntsoeAPI(object):
         else:
             return response.text
 
-    def api_call(self, method, params=(), data=None):
+    def api_call(self, method, params=(), data=None, raw=False, cache=True):
+        """
+        Implements an api call, detail and getDetailCurve/ responses are
+        served from self.cache when available, cache=False bypasses it for
+        outages still going on whose pages change. Transient errors are
+        retried according to self.retry_policy. raw=True returns the
+        response text without decoding json
+        """
+        if method not in self.__endpoints:
+            raise EntsoeApiUnkownMethod
+
+        if "POST" in self.__endpoints[method] and data is None:
+            raise EntsoeApiPOSTMethodMissingData
+
+        key = None
+        if cache and self.cache is not None and method in self.__cacheable:
+            key = self.cache.key(method, params, data)
+            text = self.cache.get(key)
+            if text is not None:
+                return text if raw else self.__decode(method, text)
+
+        if self.retry_policy is None:
+            text, response = self.__request(method, params, data, raw)
+        else:
+            text, response = self.retry_policy.call(
+                self.__request, method, params, data, raw
+            )
+
+        if key is not None and text is not None:
+            self.cache.set(key, text)
+        return response
+
+    def __request(self, method, params, data, raw=False):
         """
-        Implements an api call
+        One attempt of an api call, returns response text and decoded
+        response
         """
         t_now = timer()
-        if t_now - self.s_time > self.conn_rst_int:
-            self.s_time = t_now
+        if t_now - getattr(self.__local, "s_time", t_now) > self.conn_rst_int:
             logging.info(
                 "make new connection to server and change user-agent "
             )
             self.__renew_session()
 
-        if self.requests_num > 0 and self.requests_num % self.pause_req == 0:
-            logging.info("pausing for a while ")
-            time.sleep(self.pause_int)
-
-        self.requests_num += 1
-        if method not in self.__endpoints:
-            raise EntsoeApiUnkownMethod
-
-        if "POST" in self.__endpoints[method] and data is None:
-            raise EntsoeApiPOSTMethodMissingData
+        with self.__lock:
+            self.requests_num += 1
 
         url = self.__base_url + method
 
-        if self.__endpoints[method] is "POST":
-            data = json.dumps(data)
-            return self.__post(url, params, data)
+        self.rate_limiter.acquire()
+        try:
+            if self.__endpoints[method] == "POST":
+                text = self.__post(url, params, json.dumps(data))
+            else:
+                text = self.__get(url, params)
+        except requests.HTTPError as error:
+            status = getattr(error.response, "status_code", None)
+            if status in (429, 503):  # too many requests, unavailable
+                self.rate_limiter.backoff()
+            raise error from None
+        except (requests.ConnectionError, requests.Timeout) as error:
+            self.rate_limiter.backoff()
+            self.__renew_session()  # don't reuse a connection gone bad
+            raise error from None
         else:
-            return self.__get(url, params)
+            self.rate_limiter.success()
+
+        return text, text if raw else self.__decode(method, text)
+
+    def __decode(self, method, text):
+        if self.__endpoints[method] == "POST" and text is not None:
+            return json.loads(text)
+        return text
 
     def close(self):
         """
-        Close a requests session
+        Stops the worker threads and closes their requests sessions
         """
-        self.session.close()
-        self.session = None
+        with self.__lock:
+            executor, self.__executor = self.__executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self.__lock:
+            sessions, self.__sessions = self.__sessions, []
+        for session in sessions:
+            session.close()
+        self.__local = threading.local()
+
+    def transmission_grid_unavailability(self, **query):
+        """
+        Implements api method to get unavailability in transmission grid,
+        returns the rows of iter_grid_unavailability(**query) in a list
+        """
+        table_data = []
+        for page in self.iter_grid_unavailability(**query):
+            table_data.extend(page)
+        return table_data
 
-    def transmission_grid_unavailability(
+    def iter_grid_unavailability(
         self,
         *,
         from_date,
@@ -854,10 +1064,26 @@ class EntsoeAPI(object):
         asset_type=None,
         outage_type=None,
         outage_status=None,
+        shard_freq=None,
+        shard_by=None,
+        shard_retries=2,
+        shard_dir=None,
     ):
         """
-        Implements api method to get unavailability in transmission grid
+        Yields the rows of the unavailability in transmission grid table page
+        by page, callers can write them out without holding the table
+
+        With shard_freq (a pandas frequency e.g. "MS" for monthly) the date
+        range is split into sub-windows, with shard_by ("country" or
+        "border") the borders are split into per country or per border
+        jobs. Shards are queried independently on the worker pool, a failed
+        shard is retried up to shard_retries times and outages showing up in
+        more than one shard are returned once, rows of a shard are yielded
+        once the shard is complete. Completed shards are kept in shard_dir,
+        if given, and not downloaded again on the next run
         """
+        if shard_by not in (None, "country", "border"):
+            raise RuntimeError("shard_by domain is (country, border)")
 
         if country is None:
             borders = "ALL"
@@ -893,9 +1119,75 @@ class EntsoeAPI(object):
         )
 
         logging.info(msg)
-        table_data = []
 
-        params = (
+        def query(window, shard_borders):
+            return self.__table_params(
+                *window,
+                area_type,
+                shard_borders,
+                asset_type,
+                outage_type,
+                outage_status,
+            )
+
+        if shard_freq is None and shard_by is None:
+            logging.info("start downloading table data\n")
+            yield from self.__table_pages(query((from_date, to_date), borders))
+            logging.info("data  download completed\n\n")
+            return
+
+        if shard_freq is None:
+            windows = [(from_date, to_date)]
+        else:
+            windows = self.split_date_range(from_date, to_date, shard_freq)
+
+        shards = [
+            (f"{w[0]} - {w[1]} {name}", query(w, shard_borders))
+            for name, shard_borders in self.__border_shards(
+                borders, area_type, shard_by
+            )
+            for w in windows
+        ]
+        yield from self.__table_shards(shards, shard_retries, shard_dir)
+
+    def __border_shards(self, borders, area_type, shard_by):
+        """
+        Splits border.values into (name, borders) jobs
+        """
+        if shard_by is None:
+            return [("", borders)]
+
+        if "BORDER_CTA" in area_type:
+            catalogue = self.__cta_borders
+        else:
+            catalogue = self.__bzn_borders
+
+        if borders == "ALL":
+            groups = [(c, catalogue[c]) for c in catalogue]
+        else:
+            groups = [("", borders)]
+
+        if shard_by == "country":
+            return groups
+
+        # catalogue entries carry the country they are listed under, every
+        # entry is a query of its own
+        return [(border, [border]) for _, group in groups for border in group]
+
+    def __table_params(
+        self,
+        from_date,
+        to_date,
+        area_type,
+        borders,
+        asset_type,
+        outage_type,
+        outage_status,
+    ):
+        """
+        Query params of getDataTableData/
+        """
+        return (
             ("name", ""),
             ("defaultValue", "false"),
             ("viewType", "TABLE"),
@@ -930,6 +1222,12 @@ class EntsoeAPI(object):
             ),
         )
 
+    def __table_pages(self, params, shard=None):
+        """
+        Downloads and yields every page of a getDataTableData/ query. Pages
+        of a shard are fetched one after the other, the shards themselves
+        already run on the worker pool
+        """
         data = {
             "sEcho": 2,  # what is this ?
             "iColumns": 7,
@@ -940,38 +1238,296 @@ class EntsoeAPI(object):
             "amDataProp": [0, 1, 2, 3, 4, 5, 6],
         }
 
-        have = 0  # keep track of  data
-        logging.info("start downloading table data\n")
-        while True:
-            json_data = self.api_call("getDataTableData/", params, data)
+        def fetch(offset):
+            page = dict(data, iDisplayStart=offset)  # set pagination offset
+            # decoded here so a truncated response is retried, parsing the
+            # rows is what goes to the parser processes
+            return self.api_call("getDataTableData/", params, page)
+
+        # first page tells how many records there are, the remaining page
+        # offsets are known up front and fetched concurrently
+        json_data = self.api_call("getDataTableData/", params, data)
+        total = json_data["iTotalRecords"]
+        data_frag = self.parse_table_data(json_data)
+        have = len(data_frag)  # keep track of  data
+        self.__table_progress(have, total, shard)
+        yield data_frag
+
+        offsets = range(have, total, self.items_per_page) if have else []
+        if shard is None:
+            pages = self.__fetch_parse(
+                fetch, self.parse_table_data, offsets, "table"
+            )
+        else:
+            pages = map(self.parse_table_data, map(fetch, offsets))
+        for data_frag in pages:
+            have += len(data_frag)
+            self.__table_progress(have, total, shard)
 
-            data_frag = self.parse_table_data(json_data)
+            # pages come back in offset order
+            yield data_frag
 
-            have += len(data_frag)
-            data.update({"iDisplayStart": have})  # set pagination offset
+    def __table_shards(self, shards, retries, state_dir=None):
+        """
+        Runs (name, params) table queries on the worker pool and yields the
+        rows of every shard, rows are deduplicated by detailId keeping the
+        first shard they show up in. Every shard keeps its rows in state_dir
+        once completed
+        """
+        total = len(shards)
+        done = 0
+        done_lock = threading.Lock()
+
+        if state_dir is not None:
+            os.makedirs(state_dir, exist_ok=True)
+
+        def fetch(shard):
+            nonlocal done
+            name, params = shard
+            rows = self.__load_shard(state_dir, params)
+            if rows is not None:
+                logging.info(f"shard {name} found in {state_dir}")
+
+            attempt = 0
+            while rows is None:
+                try:
+                    # rows of a failed attempt are dropped, the whole shard
+                    # is downloaded again
+                    fetched = []
+                    for page in self.__table_pages(params, shard=name):
+                        fetched.extend(page)
+                    rows = fetched
+                except Exception as error:
+                    if attempt == retries:
+                        raise error from None
+                    attempt += 1
+                    logging.warning(
+                        f"shard {name} failed: {error}, retrying "
+                        f"[{attempt} / {retries}]"
+                    )
+                else:
+                    self.__save_shard(state_dir, params, rows)
+
+            with done_lock:
+                done += 1
+                prog = round(100 * (done / total))
+                print(f"[1/3] data   {'{:4d}'.format(prog)}%", end="\r")
+            logging.info(f"progress [{done} / {total}] shard {name}")
+            return rows
+
+        logging.info(f"start downloading table data in {total} shards\n")
+        seen = set()
+        for rows in self.__map(fetch, shards):
+            unique = []
+            for row in rows:
+                if row["detailId"] not in seen:
+                    seen.add(row["detailId"])
+                    unique.append(row)
+            yield unique
 
-            # append data
-            table_data = table_data + data_frag
-            try:
-                progress = have / json_data["iTotalRecords"]
-            except ZeroDivisionError:
-                progress = 0
+        logging.info(
+            f"data  download completed, {len(seen)} unique outages\n\n"
+        )
 
-            prog = round(100 * progress)
-            print(f"[1/3] data   {'{:4d}'.format(prog)}%", end="\r")
-            logging.info(
-                f"progress [{have} / {json_data['iTotalRecords']}] " f"data"
-            )
+    @staticmethod
+    def __shard_path(state_dir, params):
+        key = hashlib.sha1(repr(params).encode("utf-8")).hexdigest()
+        return os.path.join(state_dir, f"shard_{key}.json")
 
-            if have == json_data["iTotalRecords"]:
-                logging.info("data  download completed\n\n")
-                break
-        return table_data
+    @staticmethod
+    def __load_shard(state_dir, params):
+        """
+        Returns the rows of an already completed shard or None
+        """
+        if state_dir is None:
+            return None
+        try:
+            with open(EntsoeAPI.__shard_path(state_dir, params)) as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
 
     @staticmethod
-    def parse_table_data(json_data):
+    def __save_shard(state_dir, params, rows):
+        if state_dir is None:
+            return
+        path = EntsoeAPI.__shard_path(state_dir, params)
+        with open(path + ".tmp", "w") as fp:
+            json.dump(rows, fp)
+        _replace(path + ".tmp", path)  # never leave half written shards
+
+    @staticmethod
+    def split_date_range(from_date, to_date, freq):
+        """
+        Splits a dd.mm.YYYY date range into consecutive [from, to] windows
+        at the boundaries of a pandas frequency e.g. "MS" monthly
+        """
+        start = datetime.datetime.strptime(from_date, "%d.%m.%Y")
+        end = datetime.datetime.strptime(to_date, "%d.%m.%Y")
+        bounds = [start]
+        bounds += [
+            b.to_pydatetime()
+            for b in pd.date_range(start, end, freq=freq)
+            if start < b < end
+        ]
+        bounds.append(end)
+        return [
+            (a.strftime("%d.%m.%Y"), b.strftime("%d.%m.%Y"))
+            for a, b in zip(bounds[:-1], bounds[1:])
+        ]
+
+    @staticmethod
+    def __table_progress(have, total, shard=None):
+        if shard is not None:
+            logging.info(f"progress [{have} / {total}] shard {shard}")
+            return
+
+        try:
+            progress = have / total
+        except ZeroDivisionError:
+            progress = 0
+
+        prog = round(100 * progress)
+        print(f"[1/3] data   {'{:4d}'.format(prog)}%", end="\r")
+        logging.info(f"progress [{have} / {total}] " f"data")
+
+    @staticmethod
+    def parse_table_data(json_data, fast=True):
         """
         Parses data returned from transmission_grid_unavailability method
+
+        fast=False runs the reference BeautifulSoup parser, both give the
+        same rows (see benchmarks/bench_parse_table_data.py)
+        """
+        if not fast:
+            return EntsoeAPI.__parse_table_data_bs4(json_data)
+
+        decode = EntsoeAPI.__decode_code
+        status_codes = EntsoeAPI.__status_codes
+        nature_codes = EntsoeAPI.__nature_codes
+        data = []
+        for row in json_data["aaData"]:
+            start_date, end_date, tz = EntsoeAPI.__split_interval(
+                row[2].replace("&nbsp;", " ")
+            )
+            data.append(
+                {
+                    "status": decode(row[0], status_codes) or row[0],
+                    "nature": decode(row[1], nature_codes) or row[1],
+                    "inArea": row[3],
+                    "outArea": row[4],
+                    "newNTC": EntsoeAPI.__html_text(row[5]),
+                    "detailId": row[6],
+                    "unavailabilityStart": start_date,
+                    "unavailabilityEnd": end_date,
+                    "timezone": tz,
+                }
+            )
+        return data
+
+    @staticmethod
+    def table_to_df(data):
+        """
+        Returns a pandas dataframe from table data. The local interval
+        strings of the whole table are converted at once into
+        unavailabilityStartUTC / unavailabilityEndUTC datetime64[ns, UTC]
+        columns, the string columns are kept as they are
+        """
+        df = pd.DataFrame(data)
+        if df.empty:
+            return df
+
+        tz = df["timezone"] if "timezone" in df else "CET"
+        for column in ("unavailabilityStart", "unavailabilityEnd"):
+            df[column + "UTC"] = EntsoeAPI.to_utc(df[column], tz).set_axis(
+                df.index
+            )
+        return df
+
+    @staticmethod
+    def to_utc(dates, tz="UTC", ambiguous=False):
+        """
+        Converts dates to a datetime64[ns, UTC] series
+
+        dates are "dd.mm.YYYY HH:MM" strings local to tz (one timezone name
+        or one per date), iso strings or timestamps. Local times repeated
+        when dst ends are read as standard time unless ambiguous="infer"
+        is given for ordered dates, times skipped when dst starts are
+        shifted forward
+        """
+        dates = pd.Series(dates).reset_index(drop=True)
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            try:
+                dates = pd.to_datetime(dates, format="%d.%m.%Y %H:%M")
+            except ValueError:
+                dates = pd.to_datetime(dates, utc=True)
+        if dates.dt.tz is not None:
+            return dates.dt.tz_convert("UTC").astype("datetime64[ns, UTC]")
+
+        tz = pd.Series(tz, index=dates.index)
+        utc = pd.Series(pd.NaT, index=dates.index, dtype="datetime64[ns, UTC]")
+        # few distinct timezones, localize each group at once
+        for name, index in tz.groupby(tz).groups.items():
+            utc[index] = (
+                dates[index]
+                .dt.tz_localize(
+                    EntsoeAPI.__timezone(name),
+                    ambiguous=ambiguous,
+                    nonexistent="shift_forward",
+                )
+                .dt.tz_convert("UTC")
+            )
+        return utc
+
+    @staticmethod
+    def __timezone(name):
+        """
+        Returns the tz of a timezone name or of a dst abbreviation e.g. CEST
+        """
+        try:
+            return pytz.timezone(name)
+        except pytz.UnknownTimeZoneError:
+            pass
+        try:
+            return pytz.timezone(EntsoeAPI.__dst_abbreviations[name])
+        except KeyError:
+            raise RuntimeError(f"unknown timezone {name}") from None
+
+    @staticmethod
+    def __decode_code(value, codes):
+        """
+        Decodes an outage status / type or asset code, values that are not
+        exactly a code are searched for one like the reference parsers do.
+        Returns None for unknown values
+        """
+        name = codes.get(value)
+        if name is not None:
+            return name
+        for code, name in codes.items():
+            if code in value:
+                return name
+        return None
+
+    @staticmethod
+    def __html_text(fragment):
+        """
+        Text of a newNTC html fragment
+        """
+        if EntsoeAPI.__plain_text.match(fragment):
+            return fragment
+        return EntsoeAPI.__html_text_bs4(fragment)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def __html_text_bs4(fragment):
+        # few distinct newNTC fragments repeat over all rows of a table
+        return BeautifulSoup(fragment, "lxml").text
+
+    @staticmethod
+    def __parse_table_data_bs4(json_data):
+        """
+        Reference parser of parse_table_data, builds a BeautifulSoup document
+        for every newNTC and decodes codes with substring checks
         """
         data = [row for row in json_data["aaData"]]
 
@@ -998,6 +1554,7 @@ class EntsoeAPI(object):
                 {
                     "unavailabilityStart": start_date,
                     "unavailabilityEnd": end_date,
+                    "timezone": interval.rsplit(" (")[1].strip(" )"),
                 }
             )
 
@@ -1031,37 +1588,105 @@ class EntsoeAPI(object):
     @staticmethod
     def parse_unavailability_interval(interval, tz_support=False):
         """
-        Parses date interval in parse_table_data
+        Parses date interval in parse_table_data, with tz_support the dates
+        are timezone aware datetimes instead of strings
+        """
+        start_date, end_date, tz = EntsoeAPI.__split_interval(interval)
+
+        if tz_support:
+            tz = EntsoeAPI.__timezone(tz)
+            start_date = tz.localize(
+                datetime.datetime.strptime(start_date, "%d.%m.%Y %H:%M")
+            )
+            end_date = tz.localize(
+                datetime.datetime.strptime(end_date, "%d.%m.%Y %H:%M")
+            )
+        return [start_date, end_date]
+
+    @staticmethod
+    def __split_interval(interval):
+        """
+        Splits "start - end (tz)" into start, end and tz strings
         """
         date_string, tz = tuple(interval.rsplit(" ("))
         tz = tz.replace(")", "").strip()
 
         start_date, end_date = tuple(date_string.split(" - "))
 
-        start_date = start_date.strip()
-        end_date = end_date.strip()
-
-        """
-        start_date = datetime.datetime.strptime(start_date, "%d.%m.%Y %H:%M")
-        end_date = datetime.datetime.strptime(end_date, "%d.%m.%Y %H:%M")
-
-        if tz_support:
-            start_date = start_date.replace(tzinfo=pytz.timezone(tz))
-            end_date = end_date.replace(tzinfo=pytz.timezone(tz))
-        """
-        return [start_date, end_date]
+        return start_date.strip(), end_date.strip(), tz
 
     def details_grid_unavailability(self, detail_id):
         """
         Implements api method to get details on unavailability in transmission
         grid
         """
+        return self.parse_detail_html(self.__detail_html(detail_id))
+
+    def __detail_html(self, detail_id, cache=True):
         params = (
             ("detailId", detail_id),
             ("fullDetailId", detail_id),
             ("_", self.__unix_timestamp_mill()),
         )
-        html_tables = self.api_call("detail", params=params)
+        return self.api_call("detail", params=params, cache=cache)
+
+    @staticmethod
+    def parse_detail_html(html_tables, fast=True):
+        """
+        Parses a detail page into (comments, reason, affected assets)
+
+        The page holds three tables: comments, reason and affected assets.
+        fast=False runs the reference BeautifulSoup parser, both give the
+        same tuples
+        """
+        if not fast:
+            return EntsoeAPI.__parse_detail_html_bs4(html_tables)
+
+        comments = []
+        reasson = []
+        affected_assets = []
+
+        root = etree.HTML(html_tables) if html_tables else None
+        if root is None:
+            return comments, reasson, affected_assets
+
+        def text(element):
+            return "".join(EntsoeAPI.__element_strings(element))
+
+        for t_id, table in enumerate(root.iter("table")):
+            if t_id == 0:  # this is comments table
+                rows = list(table.iter("tr"))[1:]
+                comments = list(set(text(tr).strip() for tr in rows))
+
+            elif t_id == 1:  # this is reason table
+                rows = list(table.iter("tr"))[1:]
+                reasson = list(set(text(tr).strip() for tr in rows))
+
+            elif t_id == 2:  # this is affected assets table
+                for tr in list(table.iter("tr"))[2:]:
+                    row = []
+                    for elem in tr.iter("td"):
+                        classes = (elem.get("class") or "").split()
+                        if classes:
+                            asset = EntsoeAPI.__decode_code(
+                                classes[0], EntsoeAPI.__asset_codes
+                            )
+                            if asset is not None:
+                                row.append(asset)
+                        else:
+                            row.append(text(elem).strip())
+                    if len(row) == 1:
+                        row = [row[0] for i in range(4)]
+                    affected_assets.append(row)
+                break  # nothing of interest after the third table
+
+        return comments, reasson, affected_assets
+
+    @staticmethod
+    def __parse_detail_html_bs4(html_tables):
+        """
+        Reference parser of parse_detail_html
+        """
         soup = BeautifulSoup(html_tables, "lxml")
 
         tables = soup.find_all("table")
@@ -1071,21 +1696,21 @@ class EntsoeAPI(object):
         affected_assets = []
         for t_id, table in enumerate(tables):
 
-            if t_id is 0:  # this is comments table
+            if t_id == 0:  # this is comments table
                 table_rows = table.find_all("tr")[1:]
                 for r_id, tr in enumerate(table_rows):
                     comments.append(tr.text.strip())
 
                 comments = list(set(comments))
 
-            elif t_id is 1:  # this is reason table
+            elif t_id == 1:  # this is reason table
                 table_rows = table.find_all("tr")[1:]
                 for r_id, tr in enumerate(table_rows):
                     reasson.append(tr.text.strip())
 
                 reasson = list(set(reasson))
 
-            elif t_id is 2:  # this is affected assets table
+            elif t_id == 2:  # this is affected assets table
 
                 table_rows = table.find_all("tr")[2:]
 
@@ -1119,7 +1744,7 @@ class EntsoeAPI(object):
                                 row.append("Not specified")
                         else:
                             row.append(elem.text.strip())
-                    if len(row) is 1:
+                    if len(row) == 1:
                         row = [row[0] for i in range(4)]
                     affected_assets.append(row)
         return comments, reasson, affected_assets
@@ -1140,20 +1765,43 @@ class EntsoeAPI(object):
             "detailId": detailId,
         }
 
-    def curve_grid_unavailability(
+    def curve_grid_unavailability(self, detail_id, *args, **kwargs):
+        """
+        Implements api method getDetailCurve, returns the rows of
+        iter_curve_pages(detail_id, *args, **kwargs) in a list
+        """
+        timeseries_data = []
+        for curve_frag in self.iter_curve_pages(detail_id, *args, **kwargs):
+            timeseries_data.extend(curve_frag)
+        return timeseries_data
+
+    def iter_curve_pages(
         self,
         detail_id,
         offset=0,
         stop_offset=0,
         batch_size=None,
         batch_progress=None,
+        checkpoint=None,
+        cache=True,
     ):
         """
-        Implements api method getDetailCurve
-        """
+        Yields the getDetailCurve/ rows of detail_id page by page, cache=False
+        doesn't use the response cache
 
-        timeseries_data = []
+        With checkpoint (path of a partial file) every page is kept on disk
+        and a resumed download continues from the last completed page, the
+        pages already on disk are yielded first. The caller removes the
+        partial file once the series is safely stored
+        """
         have = offset
+        if checkpoint is not None:
+            checkpoint = CurveCheckpoint(checkpoint)
+            timeseries_data, have, total = checkpoint.load(offset)
+            if timeseries_data:
+                yield timeseries_data
+            if total is not None and (have >= total or have >= stop_offset):
+                return
 
         params = (("detailId", detail_id),)
 
@@ -1161,18 +1809,24 @@ class EntsoeAPI(object):
             "sEcho": 1,
             "iColumns": 2,
             "sColumns": "mtu,ntc",
-            "iDisplayStart": offset,
+            "iDisplayStart": have,
             "iDisplayLength": self.items_per_page,
             "amDataProp": [0, 1],
         }
 
         while True:
-            json_curve = self.api_call("getDetailCurve/", params, data)
+            json_curve = self.api_call(
+                "getDetailCurve/", params, data, cache=cache
+            )
             curve_frag = json_curve["aaData"]
+            if checkpoint is not None:
+                checkpoint.append(
+                    have, json_curve["iTotalRecords"], curve_frag
+                )
 
             have += len(curve_frag)
+            yield curve_frag
 
-            timeseries_data = timeseries_data + curve_frag
             data.update({"iDisplayStart": have})
 
             msg = (
@@ -1190,42 +1844,90 @@ class EntsoeAPI(object):
                 break
             elif have >= stop_offset:
                 break
-            else:
-                time.sleep(self.req_delay)
-
-        return timeseries_data
 
     @staticmethod
-    def curve_to_df(data):
+    def curve_to_df(data, tz="CET"):
         """
-        Returns a pandas dataframe from time series data
+        Returns a pandas dataframe from getDetailCurve/ aaData rows
+
+        interval start / interval end are datetime64[ns, UTC] converted from
+        the tz local strings at once, newNTC is int32 or float32 when the
+        values aren't whole numbers or some are missing. interval end is
+        interval start plus the length of the interval, the server labels
+        both repeated hours "02:00 - 03:00" when dst ends and an end of its
+        own can't tell which one it is
         """
-
         column = ["interval start", "interval end", "newNTC"]
+        if not len(data):
+            return pd.DataFrame(columns=column)
+
+        curve = pd.DataFrame(data).iloc[:, :2]
+        intervals = curve[0].str.split(" - ", n=1, expand=True)
+        local = [
+            pd.to_datetime(intervals[i].str.strip(), format="%d.%m.%Y %H:%M")
+            for i in (0, 1)
+        ]
+        starts = EntsoeAPI.__curve_utc(intervals[0], tz)
 
-        data = [[*row[0].split(" - "), row[1]] for row in data]
+        df = pd.DataFrame(
+            {
+                column[0]: starts,
+                column[1]: starts + (local[1] - local[0]),
+                column[2]: EntsoeAPI.__compact_ntc(curve[1]),
+            }
+        )
+        return df
 
-        df = pd.DataFrame(data, columns=column)
+    @staticmethod
+    def __curve_utc(dates, tz):
+        # a curve is ordered, the repeated hour when dst ends is told apart
+        # by its position unless the curve starts inside it
+        try:
+            return EntsoeAPI.to_utc(dates.str.strip(), tz, ambiguous="infer")
+        except (ValueError, pytz.InvalidTimeError):
+            return EntsoeAPI.to_utc(dates.str.strip(), tz)
 
-        return df
+    @staticmethod
+    def __compact_ntc(values):
+        """
+        Returns values as int32, as float32 when they don't fit
+        """
+        ntc = pd.to_numeric(values, errors="coerce")
+        whole = ntc.notna().all() and (ntc % 1 == 0).all()
+        if whole and ntc.abs().max() < 2**31:
+            return ntc.astype("int32")
+        return ntc.astype("float32")
 
     @staticmethod
     def __unix_timestamp_mill():
         return "{:.10f}".format(time.time() * 1000).split(".")[0]
 
-    def details_grid_unavailability_batch(self, detail_id_list):
+    def details_grid_unavailability_batch(self, detail_id_list, finished=None):
+        """
+        Downloads details for every id in detail_id_list, up to self.workers
+        requests are in flight at the same time. Returned details keep the
+        order of detail_id_list. With finished (detailIds of outages already
+        over) only their pages go through the response cache
+        """
         logging.info("start downloading detail data\n")
         total = len(detail_id_list)
         detail_data = []
-        for progress, i in enumerate(detail_id_list):
-            try:
-                comments, reason, affected_assets = self.details_grid_unavailability(
-                    i
-                )
-            except Exception as error:
-                logging.exception(error)
-                raise error from None
-            else:
+
+        def fetch(detail_id):
+            cache = finished is None or detail_id in finished
+            return self.__detail_html(detail_id, cache=cache)
+
+        try:
+            results = self.__fetch_parse(
+                fetch,
+                self.parse_detail_html,
+                detail_id_list,
+                "detail",
+            )
+            for progress, (i, details) in enumerate(
+                zip(detail_id_list, results)
+            ):
+                comments, reason, affected_assets = details
                 for asset in affected_assets:
                     detail = self.parse_data_details(
                         comments, reason, asset, i
@@ -1234,44 +1936,133 @@ class EntsoeAPI(object):
                 prog = round(100 * ((progress + 1) / total))
                 print(f"[2/3] detail {'{:4d}'.format(prog)}%", end="\r")
                 logging.info(f"progress [{progress + 1} / {total}] detail {i}")
-                time.sleep(self.req_delay)
+        except Exception as error:
+            logging.exception(error)
+            raise error from None
 
         logging.info("detail download completed\n\n")
         return detail_data
 
     def curve_grid_unavailability_batch(
-        self, detail_id_list, from_date, to_date, name_format, out_dir
+        self,
+        detail_id_list,
+        from_date,
+        to_date,
+        name_format,
+        out_dir,
+        journal=None,
+        mtu="1h",
+        output=None,
     ):
-        total = len(detail_id_list)
+        """
+        Downloads time series for every [detailId, start, end] in
+        detail_id_list and writes them to output, by default one csv file
+        per detailId (see output.py). Curves are independent of each other
+        so they are spread across self.workers threads. Curves are recorded
+        in journal once output has them on disk
+
+        detail_id_list may also be a stream, e.g. jobs leased from a work
+        queue, the next job is taken as soon as a thread is free. Page
+        offsets assume mtu long intervals for every curve of the batch, the
+        table doesn't tell the interval length of a curve
+        """
+        if output is None:
+            output = CsvOutput(out_dir, name_format)
+
+        def plan(items):
+            offsets, stop_offsets = self.pagination_offsets_batch(
+                [i[1] for i in items],
+                [i[2] for i in items],
+                from_date,
+                to_date,
+                mtu,
+            )
+            # pages of outages still going on change, they aren't cached
+            finished = self.to_utc(
+                pd.Series([i[2] for i in items])
+            ) < pd.Timestamp.now("UTC")
+            jobs = []
+            outside = []
+            for i, offset, stop_offset, cache in zip(
+                items,
+                offsets.tolist(),
+                stop_offsets.tolist(),
+                finished.tolist(),
+            ):
+                if stop_offset > offset:
+                    jobs.append((i, offset, stop_offset, cache))
+                else:
+                    outside.append(i[0])
+            if outside:
+                # nothing of these curves falls between from_date and to_date
+                logging.info(
+                    f"{len(outside)} time series outside session dates"
+                )
+                if journal is not None:
+                    journal.curve_done(*outside)
+            return jobs
+
+        if hasattr(detail_id_list, "__len__"):
+            if not len(detail_id_list):
+                return
+            jobs = plan(detail_id_list)
+            total = len(jobs)
+        else:
+            jobs = itertools.chain.from_iterable(
+                plan([i]) for i in detail_id_list
+            )
+            total = None
 
-        logging.info("start downloading time series data\n")
-        for progress, i in enumerate(detail_id_list):
+        done = 0
+        done_lock = threading.Lock()
 
-            offset, stop_offset = self.pagination_offsets(
-                i[1], i[2], from_date, to_date
+        def partial(detail_id):
+            return os.path.join(
+                out_dir, f"{name_format}_partial", f"{detail_id}.jsonl"
             )
 
-            try:
-                timeseries = self.curve_grid_unavailability(
-                    i[0],
-                    offset,
-                    stop_offset,
-                    batch_progress=progress + 1,
-                    batch_size=total,
-                )
-            except Exception as error:
-                logging.exception(error)
-                raise error from None
-            else:
-                ts_df = self.curve_to_df(timeseries)
-                ts_df.to_csv(
-                    os.path.join(out_dir, f"{name_format}_{i[0]}.csv"),
-                    header=ts_df.columns,
-                )
-                time.sleep(self.req_delay)
+        def persisted(detail_ids):
+            if journal is not None and detail_ids:
+                journal.curve_done(*detail_ids)
+            for detail_id in detail_ids:
+                CurveCheckpoint(partial(detail_id)).remove()
+
+        def fetch(job):
+            nonlocal done
+            i, offset, stop_offset, cache = job
+
+            with done_lock:
+                batch_progress = done + 1
+            timeseries = self.curve_grid_unavailability(
+                i[0],
+                offset,
+                stop_offset,
+                batch_progress=batch_progress,
+                batch_size=total,
+                checkpoint=partial(i[0]),
+                cache=cache,
+            )
+            ts_df = self.curve_to_df(timeseries)
+            # buffered curves keep their partial file until written
+            persisted(output.write_curve(i[0], ts_df))
+
+            with done_lock:
+                done += 1
+                if total is None:
+                    print(f"[3/3] series {'{:6d}'.format(done)}", end="\r")
+                else:
+                    prog = round(100 * (done / total))
+                    print(f"[3/3] series {'{:4d}'.format(prog)}%", end="\r")
 
-            prog = round(100 * ((progress + 1) / total))
-            print(f"[3/3] series {'{:4d}'.format(prog)}%", end="\r")
+        logging.info("start downloading time series data\n")
+        try:
+            for _ in self.__map(fetch, jobs, ordered=False):
+                pass
+        except Exception as error:
+            logging.exception(error)
+            raise error from None
+        finally:
+            persisted(output.flush())
         logging.info("time series download completed\n\n")
 
     @staticmethod
@@ -1307,35 +2098,41 @@ class EntsoeAPI(object):
         """
         Returns start and stop offset for time series pagination
         """
-
-        start_date = datetime.datetime.strptime(start_date, "%d.%m.%Y %H:%M")
-        end_date = datetime.datetime.strptime(end_date, "%d.%m.%Y %H:%M")
-        from_date = datetime.datetime.strptime(
-            from_date + " 00:00", "%d.%m.%Y %H:%M"
-        )
-        to_date = datetime.datetime.strptime(
-            to_date + " 00:00", "%d.%m.%Y %H:%M"
-        )
-
-        max_stop_offset = len(pd.date_range(start_date, end_date, freq="H"))
-
-        off_set_time = from_date - start_date
-        off_set = len(
-            pd.date_range(start_date, start_date + off_set_time, freq="H")
+        offsets, stop_offsets = EntsoeAPI.pagination_offsets_batch(
+            [start_date], [end_date], from_date, to_date
         )
-        td = to_date - from_date
-        stop_offset = off_set + 24 * td.days
+        return int(offsets[0]), int(stop_offsets[0])
 
+    @staticmethod
+    def pagination_offsets_batch(
+        start_dates, end_dates, from_date, to_date, mtu="1h"
+    ):
         """
-        logging.info(
-            f"\n"
-            f"start_date:{start_date} - end_date:{end_date}\n"
-            f"from_date: {from_date} - to_date{to_date}\n"
-            f"{td} offset: {off_set}, "
-            f"stop_offset {stop_offset} max offset: {max_stop_offset}\n\n"
-        )
-
-        if stop_offset > max_stop_offset:
-            logging.info("WARN:stop_offset greater than max_offset")
+        Returns arrays of start and stop offsets for time series pagination
+        of every start / end date pair at once
+
+        Offsets count mtu long curve intervals in UTC so dst doesn't shift
+        them, one mtu for every curve. The pages cover every interval
+        overlapping from_date to to_date, stop offsets never exceed the
+        length of the curve and an outage outside the session dates gets
+        stop offset == offset. A curve with intervals shorter than mtu
+        would stop early
         """
-        return off_set, stop_offset
+        starts = EntsoeAPI.to_utc(start_dates).values.astype("int64")
+        ends = EntsoeAPI.to_utc(end_dates).values.astype("int64")
+        window = EntsoeAPI.to_utc([from_date + " 00:00", to_date + " 00:00"])
+        from_ns, to_ns = window.values.astype("int64")
+        mtu = pd.Timedelta(mtu).value
+
+        # -(-a // b) is ceil(a / b) for integers
+        lengths = np.maximum(-(-(ends - starts) // mtu), 0)
+        offsets = np.clip((from_ns - starts) // mtu, 0, lengths)
+        stop_offsets = np.clip(-(-(to_ns - starts) // mtu), offsets, lengths)
+
+        clamped = np.count_nonzero(-(-(to_ns - starts) // mtu) > lengths)
+        if clamped:
+            logging.info(
+                f"{clamped} stop offsets past the end of their curve "
+                f"limited to the curve length"
+            )
+        return offsets, stop_offsets
@@ -17,3 +17,7 @@ class EntsoeApiBadParams(EntsoeApiExcetpion):
 
 class EntsoeApiPOSTMethodMissingData(EntsoeApiExcetpion):
     pass
+
+
+class EntsoeApiRetryBudgetExhausted(EntsoeApiExcetpion):
+    pass
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from .entsoe import EntsoeAPI
+
+
+class IntervalIndex(object):
+    """
+    Outages of table data per (inArea, outArea) border, kept in start
+    sorted NumPy arrays of UTC nanoseconds so overlap queries are binary
+    searches instead of a scan of the table
+
+    An outage overlaps [start, end) when it starts before end and ends
+    after start. Outages starting before start - the longest outage of the
+    border can't reach start, only the slice of outages starting between
+    that and end is checked
+    """
+
+    def __init__(self, data):
+        """
+        data are the rows of transmission_grid_unavailability or a table
+        dataframe
+        """
+        df = data
+        if not isinstance(data, pd.DataFrame) or (
+            "unavailabilityStartUTC" not in data
+        ):
+            df = EntsoeAPI.table_to_df(data)
+
+        self.__borders = {}
+        if df.empty:
+            return
+
+        starts = EntsoeAPI.to_utc(df["unavailabilityStartUTC"])
+        ends = EntsoeAPI.to_utc(df["unavailabilityEndUTC"])
+        df = pd.DataFrame(
+            {
+                "inArea": df["inArea"].values,
+                "outArea": df["outArea"].values,
+                "detailId": df["detailId"].values,
+                "start": starts.values.astype("int64"),
+                "end": ends.values.astype("int64"),
+            }
+        ).drop_duplicates("detailId")
+
+        for border, group in df.groupby(["inArea", "outArea"], sort=False):
+            group = group.sort_values("start", kind="stable")
+            start = group["start"].to_numpy()
+            end = group["end"].to_numpy()
+            self.__borders[border] = (
+                start,
+                end,
+                np.sort(end),
+                group["detailId"].to_numpy(),
+                int((end - start).max()),
+            )
+
+    @staticmethod
+    def __ns(time):
+        """
+        UTC nanoseconds of a timestamp, naive times are UTC
+        """
+        time = pd.Timestamp(time)
+        if time.tzinfo is None:
+            return time.tz_localize("UTC").value
+        return time.value
+
+    def borders(self):
+        return list(self.__borders)
+
+    def __selected(self, border):
+        if border is None:
+            return self.__borders.values()
+        try:
+            return [self.__borders[tuple(border)]]
+        except KeyError:
+            return []
+
+    def overlapping(self, start, end, border=None):
+        """
+        Returns the detailIds of the outages of border (inArea, outArea),
+        of every border by default, overlapping [start, end)
+        """
+        start = self.__ns(start)
+        end = self.__ns(end)
+        found = []
+        for starts, ends, _, ids, longest in self.__selected(border):
+            lo = np.searchsorted(starts, start - longest, "right")
+            hi = np.searchsorted(starts, end, "left")
+            found.append(ids[lo:hi][ends[lo:hi] > start])
+        if not found:
+            return np.array([], dtype=object)
+        return np.concatenate(found)
+
+    def active(self, time, border=None):
+        """
+        Returns the detailIds of the outages of border active at time
+        """
+        time = self.__ns(time)
+        return self.overlapping(time, time + 1, border)
+
+    def count_active(self, times, border=None):
+        """
+        Returns how many outages of border are active at each of times, at
+        once for the whole array
+        """
+        times = EntsoeAPI.to_utc(times).values.astype("int64")
+        counts = np.zeros(len(times), dtype="int64")
+        for starts, _, ends_sorted, _, _ in self.__selected(border):
+            # started by then minus already ended by then
+            counts += np.searchsorted(starts, times, "right")
+            counts -= np.searchsorted(ends_sorted, times, "right")
+        return counts
@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import threading
+
+
+class SessionJournal(object):
+    """
+    Append only journal of a download session, one JSON record per line
+
+    Records
+    -----------------
+        {"stage": name}     : a session stage completed e.g. "table"
+        {"curve": detailId} : time series of detailId is on disk
+
+    Every record is flushed and fsync'd before the call returns, a resumed
+    session replays the journal instead of scanning the output directory
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.stages = set()
+        self.curves = set()
+        self.__lock = threading.Lock()
+        self.__replay()
+        self.__fp = open(path, "a", encoding="utf-8")
+        if self.__fp.tell() > 0 and not self.__ends_with_newline():
+            self.__fp.write("\n")  # don't glue new records to a torn line
+
+    def __replay(self):
+        try:
+            fp = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+
+        with fp:
+            for n, line in enumerate(fp):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a crash while appending leaves a torn last line
+                    logging.info(f"journal {self.path} bad record line {n}")
+                    continue
+                self.__apply(record)
+
+        logging.info(
+            f"journal {self.path} replayed, stages: {sorted(self.stages)} "
+            f"curves: {len(self.curves)}"
+        )
+
+    def __ends_with_newline(self):
+        with open(self.path, "rb") as fp:
+            fp.seek(-1, os.SEEK_END)
+            return fp.read(1) == b"\n"
+
+    def __apply(self, record):
+        if "stage" in record:
+            self.stages.add(record["stage"])
+        elif "curve" in record:
+            self.curves.add(record["curve"])
+
+    def __append(self, *records):
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        with self.__lock:
+            self.__fp.write(lines)
+            self.__fp.flush()
+            os.fsync(self.__fp.fileno())
+            for record in records:
+                self.__apply(record)
+
+    def stage_done(self, stage):
+        self.__append({"stage": stage})
+
+    def curve_done(self, *detail_ids):
+        self.__append(*[{"curve": detail_id} for detail_id in detail_ids])
+
+    def close(self):
+        with self.__lock:
+            self.__fp.close()
+
+
+class CurveCheckpoint(object):
+    """
+    Partial time series of one detailId, every downloaded getDetailCurve/
+    page is appended and fsync'd as {"offset", "total", "rows"} so a crashed
+    download continues from the last completed page
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__valid = None  # bytes of good pages found by load
+
+    def load(self, offset):
+        """
+        Returns (rows, next offset, total records) of the pages already on
+        disk for a download starting at offset, total is None when there
+        is nothing to resume. Whatever follows the last good page is cut
+        off by the next append
+        """
+        rows = []
+        have = offset
+        total = None
+        self.__valid = 0
+        try:
+            fp = open(self.path, "rb")
+        except FileNotFoundError:
+            return rows, have, total
+
+        with fp:
+            for line in fp:
+                if not line.endswith(b"\n"):
+                    break  # torn last page, download it again
+                try:
+                    page = json.loads(line)
+                except ValueError:
+                    break
+                if page["offset"] != have:
+                    break  # checkpoint of a different pagination
+                rows.extend(page["rows"])
+                have += len(page["rows"])
+                total = page["total"]
+                self.__valid += len(line)
+
+        if total is not None:
+            logging.info(f"resuming {self.path} from offset {have}")
+        return rows, have, total
+
+    def append(self, offset, total, rows):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        line = json.dumps({"offset": offset, "total": total, "rows": rows})
+        with open(self.path, "a", encoding="utf-8") as fp:
+            if self.__valid is not None:
+                # drop what load couldn't use, the page follows the last
+                # good one
+                fp.truncate(self.__valid)
+                self.__valid = None
+            elif fp.tell() > 0 and not self.__ends_with_newline():
+                fp.write("\n")
+            fp.write(line + "\n")
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    def __ends_with_newline(self):
+        with open(self.path, "rb") as fp:
+            fp.seek(-1, os.SEEK_END)
+            return fp.read(1) == b"\n"
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,405 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+import pandas as pd
+
+from .rle import RleCurve
+
+
+def _replace(tmp, path):
+    """
+    Moves a written tmp file to path once its content is on disk, readers
+    never see half written files
+    """
+    fd = os.open(tmp, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp, path)
+
+
+class CsvOutput(object):
+    """
+    Session table in {name_format}.csv and one {name_format}_{detailId}.csv
+    file per time series, every curve is on disk once write_curve returns.
+    compression e.g. "gzip" compresses the files, .csv.gz
+    """
+
+    __extensions = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz", "zstd": ".zst"}
+
+    def __init__(self, out_dir, name_format, compression=None):
+        self.out_dir = out_dir
+        self.name_format = name_format
+        self.compression = compression
+        self.suffix = ".csv" + self.__extensions.get(compression, "")
+        self.table_path = os.path.join(out_dir, name_format + self.suffix)
+
+    def write_table(self, df):
+        self.__write(df, self.table_path, index=False)
+
+    def __write(self, df, path, index=True):
+        tmp = f"{path}.tmp"
+        df.to_csv(
+            tmp, header=df.columns, index=index, compression=self.compression
+        )
+        _replace(tmp, path)
+
+    def read_table(self):
+        """
+        Returns the session table or None when it hasn't been written yet
+        """
+        if not os.path.isfile(self.table_path):
+            return None
+        return pd.read_csv(self.table_path, compression=self.compression)
+
+    def __curve_path(self, detail_id):
+        return os.path.join(
+            self.out_dir, f"{self.name_format}_{detail_id}{self.suffix}"
+        )
+
+    def write_curve(self, detail_id, df):
+        """
+        Writes the time series of detail_id, returns the detailIds whose
+        time series are now on disk
+        """
+        self.__write(df, self.__curve_path(detail_id))
+        return [detail_id]
+
+    def read_curve(self, detail_id):
+        """
+        Returns the time series of detail_id as written, KeyError when
+        there is none
+        """
+        path = self.__curve_path(detail_id)
+        if not os.path.isfile(path):
+            raise KeyError(detail_id)
+        return pd.read_csv(path, index_col=0, compression=self.compression)
+
+    def iter_curves(self, detail_ids):
+        """
+        Yields (detailId, time series) of the detail_ids that have one
+        """
+        for detail_id in detail_ids:
+            try:
+                yield detail_id, self.read_curve(detail_id)
+            except KeyError:
+                continue
+
+    def flush(self):
+        return []
+
+
+class ParquetOutput(object):
+    """
+    Session table in {name_format}.parquet and time series appended to a
+    parquet dataset partitioned by border and month
+
+        {name_format}_curves/border=BZN_CZ-BZN_PL/month=2018-05/part-*.parquet
+
+    Curves are buffered and written batch_rows rows at a time, one
+    compressed file per partition with row groups of row_group_size rows,
+    detailId is a column of the dataset. Needs pyarrow
+    """
+
+    def __init__(
+        self,
+        out_dir,
+        name_format,
+        batch_rows=500000,
+        row_group_size=100000,
+        compression="zstd",
+    ):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError(
+                "parquet output needs pyarrow, pip install pyarrow"
+            ) from None
+        self.__pa = pyarrow
+        self.__pq = pyarrow.parquet
+
+        self.out_dir = out_dir
+        self.name_format = name_format
+        self.batch_rows = batch_rows
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.table_path = os.path.join(out_dir, f"{name_format}.parquet")
+        self.dataset_path = os.path.join(out_dir, f"{name_format}_curves")
+
+        self.__borders = None
+        self.__frames = []
+        self.__ids = []
+        self.__rows = 0
+        self.__lock = threading.Lock()
+
+    def write_table(self, df):
+        table = self.__pa.Table.from_pandas(df, preserve_index=False)
+        self.__write(table, self.table_path)
+        self.__borders = self.__border_map(df)
+
+    def read_table(self):
+        """
+        Returns the session table or None when it hasn't been written yet
+        """
+        if not os.path.isfile(self.table_path):
+            return None
+        return pd.read_parquet(self.table_path)
+
+    def read_curves(self, detail_ids=None):
+        """
+        Loads the time series of detail_ids, of every outage by default
+        """
+        filters = None
+        if detail_ids is not None:
+            filters = [("detailId", "in", [str(i) for i in detail_ids])]
+        return pd.read_parquet(self.dataset_path, filters=filters)
+
+    def read_curve(self, detail_id):
+        """
+        Returns the time series of detail_id, KeyError when there is none
+        """
+        df = None
+        if os.path.isdir(self.dataset_path):
+            df = self.read_curves([detail_id])
+        if df is None or df.empty:
+            raise KeyError(detail_id)
+        df = df.sort_values("interval start", ignore_index=True)
+        return df[["interval start", "interval end", "newNTC"]]
+
+    def iter_curves(self, detail_ids):
+        """
+        Yields (detailId, time series) of the detail_ids that have one,
+        the dataset is read once for all of them
+        """
+        detail_ids = [str(i) for i in detail_ids]
+        if not detail_ids or not os.path.isdir(self.dataset_path):
+            return
+        df = self.read_curves(detail_ids)
+        df["detailId"] = df["detailId"].astype(str)
+        columns = ["interval start", "interval end", "newNTC"]
+        for detail_id, curve in df.groupby("detailId", sort=False):
+            curve = curve.sort_values("interval start", ignore_index=True)
+            yield detail_id, curve[columns]
+
+    def write_curve(self, detail_id, df):
+        """
+        Buffers the time series of detail_id, returns the detailIds whose
+        time series went to disk with this call
+        """
+        border = self.__border(detail_id)
+        df = df.assign(
+            detailId=str(detail_id),
+            border=border,
+            month=df["interval start"].dt.strftime("%Y-%m"),
+        )
+        with self.__lock:
+            self.__frames.append(df)
+            self.__ids.append(detail_id)
+            self.__rows += len(df)
+            if self.__rows < self.batch_rows:
+                return []
+            return self.__flush()
+
+    def flush(self):
+        """
+        Writes the buffered time series, returns their detailIds
+        """
+        with self.__lock:
+            return self.__flush()
+
+    def __flush(self):
+        if not self.__frames:
+            return []
+        df = pd.concat(self.__frames, ignore_index=True)
+        for (border, month), part in df.groupby(["border", "month"]):
+            path = os.path.join(
+                self.dataset_path,
+                f"border={border}",
+                f"month={month}",
+                f"part-{uuid.uuid4().hex}.parquet",
+            )
+            table = self.__pa.Table.from_pandas(
+                part.drop(columns=["border", "month"]), preserve_index=False
+            )
+            self.__write(table, path)
+
+        flushed = self.__ids
+        self.__frames = []
+        self.__ids = []
+        self.__rows = 0
+        return flushed
+
+    def __write(self, table, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        self.__pq.write_table(
+            table,
+            tmp,
+            row_group_size=self.row_group_size,
+            compression=self.compression,
+        )
+        _replace(tmp, path)
+
+    def __border(self, detail_id):
+        if self.__borders is None:
+            # worker or resumed session, the table was written before
+            df = self.read_table()
+            self.__borders = {} if df is None else self.__border_map(df)
+        return self.__borders.get(str(detail_id), "unknown")
+
+    @staticmethod
+    def __border_map(df):
+        """
+        detailId -> partition value of its inArea-outArea border
+        """
+        borders = df["inArea"].astype(str) + "-" + df["outArea"].astype(str)
+        borders = borders.str.replace(r"[^\w+.-]", "_", regex=True)
+        return dict(zip(df["detailId"].astype(str), borders))
+
+
+class DedupCsvOutput(CsvOutput):
+    """
+    CsvOutput storing every distinct time series once, curves are csv files
+    named after the sha256 of their content
+
+        objects/{sha256[:2]}/{sha256}.csv        : shared by every session
+        {name_format}_curves.jsonl               : {"detailId", "sha256"}
+
+    read_curve resolves a detailId through the index, the hash identifies
+    a curve's content and can be used as a cache key
+    """
+
+    def __init__(self, out_dir, name_format):
+        super().__init__(out_dir, name_format)
+        self.objects_dir = os.path.join(out_dir, "objects")
+        self.index_path = os.path.join(out_dir, f"{name_format}_curves.jsonl")
+        self.__hashes = {}
+        self.__lock = threading.Lock()
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line
+                    self.__hashes[entry["detailId"]] = entry["sha256"]
+        except FileNotFoundError:
+            pass
+
+    def __object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.csv")
+
+    def curve_hash(self, detail_id):
+        """
+        Returns the sha256 of the time series of detail_id or None
+        """
+        return self.__hashes.get(str(detail_id))
+
+    def curve_path(self, detail_id):
+        digest = self.curve_hash(detail_id)
+        return None if digest is None else self.__object_path(digest)
+
+    def read_curve(self, detail_id):
+        """
+        Returns the time series of detail_id as written
+        """
+        path = self.curve_path(detail_id)
+        if path is None:
+            raise KeyError(detail_id)
+        return pd.read_csv(path, index_col=0)
+
+    def write_curve(self, detail_id, df):
+        """
+        Stores the time series of detail_id unless the same content is
+        stored already, returns the detailIds whose time series are now
+        on disk
+        """
+        self.__store(detail_id, df.to_csv(header=df.columns).encode("utf-8"))
+        return [detail_id]
+
+    def __store(self, detail_id, payload):
+        digest = hashlib.sha256(payload).hexdigest()
+        path = self.__object_path(digest)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as fp:
+                fp.write(payload)
+            _replace(tmp, path)
+
+        line = json.dumps({"detailId": str(detail_id), "sha256": digest})
+        with self.__lock:
+            with open(self.index_path, "a", encoding="utf-8") as fp:
+                fp.write(line + "\n")
+                fp.flush()
+                os.fsync(fp.fileno())
+            self.__hashes[str(detail_id)] = digest
+        return digest
+
+    def import_files(self):
+        """
+        Moves the {name_format}_{detailId}.csv files of a session written
+        by CsvOutput into the object store, returns how many
+        """
+        prefix = f"{self.name_format}_"
+        imported = 0
+        for f in sorted(os.listdir(self.out_dir)):
+            if not (f.startswith(prefix) and f.endswith(".csv")):
+                continue
+            path = os.path.join(self.out_dir, f)
+            with open(path, "rb") as fp:
+                self.__store(f[len(prefix) : -len(".csv")], fp.read())
+            os.remove(path)
+            imported += 1
+        return imported
+
+
+class RleOutput(CsvOutput):
+    """
+    CsvOutput writing time series run length encoded, one
+    {name_format}_{detailId}.rle.csv file of (segment start, segment end,
+    mtu, newNTC) rows per curve, see rle.py
+    """
+
+    def __init__(self, out_dir, name_format, compression=None):
+        super().__init__(out_dir, name_format, compression=compression)
+        self.curve_suffix = ".rle" + self.suffix
+
+    def __curve_path(self, detail_id):
+        return os.path.join(
+            self.out_dir, f"{self.name_format}_{detail_id}{self.curve_suffix}"
+        )
+
+    def write_curve(self, detail_id, df):
+        """
+        Writes the segments of the time series of detail_id, returns the
+        detailIds whose time series are now on disk
+        """
+        path = self.__curve_path(detail_id)
+        tmp = f"{path}.tmp"
+        RleCurve.from_df(df).to_frame().to_csv(
+            tmp, index=False, compression=self.compression
+        )
+        _replace(tmp, path)
+        return [detail_id]
+
+    def read_rle(self, detail_id):
+        """
+        Returns the RleCurve of detail_id, KeyError when there is none
+        """
+        path = self.__curve_path(detail_id)
+        if not os.path.isfile(path):
+            raise KeyError(detail_id)
+        df = pd.read_csv(path, compression=self.compression)
+        return RleCurve.from_frame(df)
+
+    def read_curve(self, detail_id):
+        """
+        Returns the time series of detail_id decoded into hourly rows
+        """
+        return self.read_rle(detail_id).to_df()
@@ -0,0 +1,107 @@
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from timeit import default_timer as timer
+
+
+def _timed(parse, raw):
+    """
+    runs in a parser process, returns parsed data and cpu time spent
+    """
+    t_start = timer()
+    data = parse(raw)
+    return data, timer() - t_start
+
+
+class ParsePipeline(object):
+    """
+    Two stage pipeline, a pool of I/O threads only fetches raw responses and
+    hands them to a process pool of parsers so parsing uses every core and
+    never holds up the sockets
+
+    At most queue_size raw responses wait for a parser, fetching pauses when
+    the parsers fall behind. Queue depth and utilization of both stages are
+    logged once the pipeline is drained to help sizing the pools
+    """
+
+    def __init__(
+        self, io_workers, parse_workers, queue_size=None, io_pool=None
+    ):
+        self.io_workers = io_workers
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size or 2 * parse_workers
+        self.io_pool = io_pool  # long lived I/O threads of the caller
+
+    def map(self, fetch, parse, items, name="pipeline"):
+        """
+        Yields parse(fetch(item)) for every item, in the order of items.
+        parse must be picklable e.g. a module function or a staticmethod
+        """
+        lock = threading.Lock()
+        slots = threading.BoundedSemaphore(self.queue_size)
+        stats = {
+            "io_busy": 0.0,
+            "parse_busy": 0.0,
+            "depth": 0,
+            "max_depth": 0,
+            "depth_sum": 0,
+            "items": 0,
+        }
+
+        def parsed(future):
+            slots.release()
+            with lock:
+                stats["depth"] -= 1
+                if not future.cancelled() and future.exception() is None:
+                    stats["parse_busy"] += future.result()[1]
+
+        def io_task(item):
+            t_start = timer()
+            raw = fetch(item)
+            t_fetched = timer()
+            slots.acquire()  # back pressure when parsers fall behind
+            with lock:
+                stats["io_busy"] += t_fetched - t_start
+                stats["depth"] += 1
+                stats["items"] += 1
+                stats["depth_sum"] += stats["depth"]
+                stats["max_depth"] = max(stats["max_depth"], stats["depth"])
+            future = parse_pool.submit(_timed, parse, raw)
+            future.add_done_callback(parsed)
+            return future
+
+        t_start = timer()
+        parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+        # start parser processes before any I/O thread is running
+        parse_pool.submit(int).result()
+        io_pool = self.io_pool
+        if io_pool is None:
+            io_pool = ThreadPoolExecutor(max_workers=self.io_workers)
+        futures = [io_pool.submit(io_task, item) for item in items]
+        try:
+            for future in futures:
+                yield future.result().result()[0]
+        finally:
+            for future in futures:
+                future.cancel()
+            if self.io_pool is None:
+                io_pool.shutdown(wait=True)
+            else:
+                wait(futures)
+            parse_pool.shutdown(wait=True)
+
+            self.__report(name, stats, timer() - t_start)
+
+    def __report(self, name, stats, elapsed):
+        if not stats["items"] or elapsed <= 0:
+            return
+        io_util = stats["io_busy"] / (self.io_workers * elapsed)
+        parse_util = stats["parse_busy"] / (self.parse_workers * elapsed)
+        logging.info(
+            f"{name} pipeline: {stats['items']} items in {elapsed:.1f} s | "
+            f"io {self.io_workers} threads {100 * io_util:.0f}% busy | "
+            f"parse {self.parse_workers} processes "
+            f"{100 * parse_util:.0f}% busy | parse queue depth "
+            f"max {stats['max_depth']} "
+            f"avg {stats['depth_sum'] / stats['items']:.1f}"
+        )
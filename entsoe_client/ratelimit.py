@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from timeit import default_timer as timer
+
+
+class RateLimiter(object):
+    """
+    Thread safe rate limiter shared by all api calls of a client
+
+    Modes
+    -----------------
+        token_bucket: requests are allowed at a fixed rate (requests per
+                      second) with bursts of up to burst requests
+        aimd        : token bucket whose rate adapts to the server, rate is
+                      cut multiplicatively when the server pushes back
+                      (HTTP 429/503, connection resets) and raised
+                      additively after every successful request
+    """
+
+    __modes = ("token_bucket", "aimd")
+
+    def __init__(
+        self,
+        rate=1.0,
+        burst=1,
+        mode="token_bucket",
+        min_rate=0.05,
+        max_rate=None,
+        increase=0.01,
+        decrease=0.5,
+    ):
+        if mode not in self.__modes:
+            raise RuntimeError(f"rate limiter mode domain is {self.__modes}")
+        if rate <= 0:
+            raise RuntimeError("rate must be greater than 0")
+        if burst < 1:
+            raise RuntimeError("burst must be at least 1")
+        if not 0 < decrease < 1:
+            raise RuntimeError("decrease domain is (0, 1)")
+
+        self.mode = mode
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.increase = increase
+        self.decrease = decrease
+
+        self.__lock = threading.Lock()
+        self.__tokens = burst
+        self.__last = timer()
+        self.__last_backoff = 0
+
+    def __refill(self, t_now):
+        self.__tokens = min(
+            self.burst, self.__tokens + (t_now - self.__last) * self.rate
+        )
+        self.__last = t_now
+
+    def acquire(self):
+        """
+        Blocks until a request is allowed to go out
+        """
+        while True:
+            with self.__lock:
+                self.__refill(timer())
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens) / self.rate
+            time.sleep(wait)
+
+    def success(self):
+        """
+        Reports a successful request, aimd mode ramps up the rate
+        """
+        if self.mode != "aimd":
+            return
+        with self.__lock:
+            self.__refill(timer())
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def backoff(self):
+        """
+        Reports the server pushing back, aimd mode cuts the rate and drops
+        the tokens left in the bucket
+        """
+        if self.mode != "aimd":
+            return
+        with self.__lock:
+            t_now = timer()
+            # failures of requests already in flight belong to the same
+            # congestion event, cut the rate once per request interval
+            if t_now - self.__last_backoff < 1 / self.rate:
+                return
+            self.__refill(t_now)
+            self.__last_backoff = t_now
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.__tokens = 0
+            rate = self.rate
+        logging.info(f"server pushed back, rate down to {rate:.3f} req/s")
@@ -0,0 +1,78 @@
+import json
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from .exceptions import EntsoeApiRetryBudgetExhausted
+
+
+class RetryPolicy(object):
+    """
+    Retries transient errors (connection resets, timeouts, HTTP 429/5xx,
+    truncated responses) with jittered exponential backoff
+
+    Every call gets up to retries attempts after the first one, all calls
+    share a budget of budget retries, None means unlimited. Once the budget
+    is spent errors are raised as EntsoeApiRetryBudgetExhausted
+    """
+
+    def __init__(self, retries=5, base_delay=1, max_delay=120, budget=None):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.retried = 0
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def is_transient(error):
+        if isinstance(error, requests.HTTPError):
+            status = getattr(error.response, "status_code", None)
+            return status == 429 or (status is not None and status >= 500)
+        return isinstance(
+            error,
+            (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+                json.JSONDecodeError,  # html error page instead of json
+            ),
+        )
+
+    def __spend(self):
+        with self.__lock:
+            if self.budget is not None and self.retried >= self.budget:
+                return False
+            self.retried += 1
+            return True
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls func retrying transient errors
+        """
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as error:
+                if not self.is_transient(error) or attempt >= self.retries:
+                    raise error from None
+                if not self.__spend():
+                    raise EntsoeApiRetryBudgetExhausted(
+                        f"retry budget of {self.budget} spent, last error: "
+                        f"{error}"
+                    ) from None
+
+                attempt += 1
+                # full jitter keeps workers from retrying in lockstep
+                delay = random.uniform(
+                    0, min(self.max_delay, self.base_delay * 2 ** attempt)
+                )
+                logging.warning(
+                    f"{error}, retry [{attempt} / {self.retries}] in "
+                    f"{delay:.1f} seconds"
+                )
+                time.sleep(delay)
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+
+class RleCurve(object):
+    """
+    Run length encoded time series, consecutive intervals of the same
+    length and NTC are kept as one (start, end, mtu, ntc) segment. Times
+    are UTC nanoseconds, to_df gives back the curve_to_df rows exactly
+    """
+
+    columns = ["segment start", "segment end", "mtu", "newNTC"]
+
+    def __init__(self, starts, ends, mtus, ntc):
+        self.starts = np.asarray(starts, dtype="int64")
+        self.ends = np.asarray(ends, dtype="int64")
+        self.mtus = np.asarray(mtus, dtype="int64")
+        self.ntc = np.asarray(ntc)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_df(cls, df):
+        """
+        Encodes a curve_to_df dataframe. Rows are sorted by start, repeated
+        rows and zero length intervals are dropped, overlapping intervals
+        raise RuntimeError
+        """
+        # entsoe imports this module through output.py
+        from .entsoe import EntsoeAPI
+
+        to_utc = EntsoeAPI.to_utc
+        rows = pd.DataFrame(
+            {
+                "start": to_utc(df["interval start"]).values.astype("int64"),
+                "end": to_utc(df["interval end"]).values.astype("int64"),
+                "ntc": df["newNTC"].to_numpy(),
+            }
+        )
+        rows = rows.drop_duplicates().sort_values("start", kind="stable")
+        rows = rows[rows["end"] != rows["start"]]
+        starts = rows["start"].to_numpy()
+        ends = rows["end"].to_numpy()
+        ntc = rows["ntc"].to_numpy()
+        mtus = ends - starts
+        if not len(starts):
+            return cls(starts, ends, mtus, ntc)
+        if (mtus < 0).any():
+            raise RuntimeError("curve has intervals ending before they start")
+        if (starts[1:] < ends[:-1]).any():
+            raise RuntimeError("curve has overlapping intervals")
+
+        # a row continues the run of the previous row when it follows it
+        # and has the same length and value, missing values are equal
+        missing = pd.isna(ntc)
+        same = np.zeros(len(starts), dtype=bool)
+        same[1:] = (
+            (starts[1:] == ends[:-1])
+            & (mtus[1:] == mtus[:-1])
+            & ((ntc[1:] == ntc[:-1]) | (missing[1:] & missing[:-1]))
+        )
+        first = np.flatnonzero(~same)
+        last = np.append(first[1:] - 1, len(starts) - 1)
+        return cls(starts[first], ends[last], mtus[first], ntc[first])
+
+    def to_df(self):
+        """
+        Decodes into curve_to_df rows
+        """
+        counts = (self.ends - self.starts) // self.mtus
+        steps = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        starts = np.repeat(self.starts, counts) + steps * np.repeat(
+            self.mtus, counts
+        )
+        ends = starts + np.repeat(self.mtus, counts)
+        return pd.DataFrame(
+            {
+                "interval start": pd.to_datetime(starts, utc=True),
+                "interval end": pd.to_datetime(ends, utc=True),
+                "newNTC": np.repeat(self.ntc, counts),
+            }
+        )
+
+    @staticmethod
+    def __ns(time):
+        time = pd.Timestamp(time)
+        if time.tzinfo is None:
+            time = time.tz_localize("UTC")
+        return time.value
+
+    def slice(self, start=None, end=None):
+        """
+        Returns the intervals overlapping [start, end), whole intervals
+        only, segments are cut on interval boundaries
+        """
+        if not len(self):
+            return self
+        start = self.starts[0] if start is None else self.__ns(start)
+        end = self.ends[-1] if end is None else self.__ns(end)
+        lo = np.searchsorted(self.ends, start, "right")
+        hi = np.searchsorted(self.starts, end, "left")
+
+        seg_starts = self.starts[lo:hi]
+        mtus = self.mtus[lo:hi]
+        counts = (self.ends[lo:hi] - seg_starts) // mtus
+        first = np.clip((start - seg_starts) // mtus, 0, counts)
+        last = np.clip(-(-(end - seg_starts) // mtus), first, counts)
+        return RleCurve(
+            seg_starts + first * mtus,
+            seg_starts + last * mtus,
+            mtus,
+            self.ntc[lo:hi],
+        )
+
+    def at(self, time):
+        """
+        Returns the NTC at time, NaN outside the curve
+        """
+        time = self.__ns(time)
+        i = np.searchsorted(self.starts, time, "right") - 1
+        if i < 0 or time >= self.ends[i]:
+            return np.nan
+        return self.ntc[i]
+
+    def to_frame(self):
+        """
+        Segments as a dataframe, the rle output file format
+        """
+        return pd.DataFrame(
+            {
+                "segment start": pd.to_datetime(self.starts, utc=True),
+                "segment end": pd.to_datetime(self.ends, utc=True),
+                "mtu": pd.to_timedelta(self.mtus, unit="ns"),
+                "newNTC": self.ntc,
+            },
+            columns=self.columns,
+        )
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Reads segments written by to_frame, e.g. loaded from csv
+        """
+        # entsoe imports this module through output.py
+        from .entsoe import EntsoeAPI
+
+        to_utc = EntsoeAPI.to_utc
+        mtus = pd.to_timedelta(df["mtu"]).values.astype("timedelta64[ns]")
+        # csv widens the int32 / float32 of curve_to_df
+        ntc_type = "int32" if df["newNTC"].dtype.kind in "iu" else "float32"
+        return cls(
+            to_utc(df["segment start"]).values.astype("int64"),
+            to_utc(df["segment end"]).values.astype("int64"),
+            mtus.astype("int64"),
+            df["newNTC"].to_numpy().astype(ntc_type),
+        )
@@ -0,0 +1,314 @@
+import contextlib
+import sqlite3
+
+import pandas as pd
+
+from .entsoe import EntsoeAPI
+
+
+class OutageStore(object):
+    """
+    Outages, details and time series of any number of sessions merged into
+    one SQLite database, a detailId downloaded again replaces the stored
+    one. Can be used as session output (see output.py), the outages of
+    session are then remembered so read_table returns only those
+
+    Times are UTC "YYYY-MM-DD HH:MM:SS" text, outages are indexed on
+    detailId, inArea / outArea and their interval so queries like
+
+        store.outages(in_area="BZN|AT", out_area="BZN|DE", nature="Forced",
+                      start="2019-03-01", end="2019-04-01")
+
+    don't scan the whole table
+    """
+
+    __outage_columns = [
+        "detailId",
+        "status",
+        "nature",
+        "inArea",
+        "outArea",
+        "newNTC",
+        "timezone",
+        "unavailabilityStart",
+        "unavailabilityEnd",
+        "unavailabilityStartUTC",
+        "unavailabilityEndUTC",
+    ]
+
+    __detail_columns = [
+        "detailId",
+        "code",
+        "type",
+        "name",
+        "location",
+        "comments",
+        "reason",
+    ]
+
+    def __init__(self, path, session=None):
+        self.path = path
+        self.session = session
+        self.table_path = path
+        with self.__connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS outages ("
+                "detailId TEXT PRIMARY KEY, status TEXT, nature TEXT, "
+                "inArea TEXT, outArea TEXT, newNTC TEXT, timezone TEXT, "
+                "unavailabilityStart TEXT, unavailabilityEnd TEXT, "
+                "unavailabilityStartUTC TEXT, unavailabilityEndUTC TEXT)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS details ("
+                "detailId TEXT NOT NULL, code TEXT, type TEXT, name TEXT, "
+                "location TEXT, comments TEXT, reason TEXT)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS curves ("
+                "detailId TEXT NOT NULL, intervalStart TEXT NOT NULL, "
+                "intervalEnd TEXT, newNTC REAL, "
+                "PRIMARY KEY (detailId, intervalStart)) WITHOUT ROWID"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session TEXT NOT NULL, detailId TEXT NOT NULL, "
+                "PRIMARY KEY (session, detailId)) WITHOUT ROWID"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS outages_border "
+                "ON outages (inArea, outArea)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS outages_out_area "
+                "ON outages (outArea)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS outages_interval "
+                "ON outages (unavailabilityStartUTC, unavailabilityEndUTC)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS outages_end "
+                "ON outages (unavailabilityEndUTC)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS details_detail_id "
+                "ON details (detailId)"
+            )
+
+    @contextlib.contextmanager
+    def __connect(self):
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def __utc_text(dates):
+        return EntsoeAPI.to_utc(dates).dt.strftime("%Y-%m-%d %H:%M:%S")
+
+    @staticmethod
+    def __rows(df, columns):
+        """
+        Rows of the columns of df, missing columns and values are NULL
+        """
+        df = df.reindex(columns=columns).astype(object)
+        return df.where(df.notna(), None).values.tolist()
+
+    def write_table(self, df):
+        """
+        Upserts the outages of a session table, with details merged in as
+        main.py writes it
+        """
+        if df.empty:
+            return
+        df = df.assign(detailId=df["detailId"].astype(str))
+        if "unavailabilityStartUTC" not in df:
+            df = EntsoeAPI.table_to_df(df)
+        for column in ("unavailabilityStartUTC", "unavailabilityEndUTC"):
+            df[column] = self.__utc_text(df[column]).set_axis(df.index)
+        outages = df.drop_duplicates("detailId")
+
+        with self.__connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                f"INSERT OR REPLACE INTO outages "
+                f"({', '.join(self.__outage_columns)}) VALUES "
+                f"({', '.join('?' * len(self.__outage_columns))})",
+                self.__rows(outages, self.__outage_columns),
+            )
+            if "code" in df:
+                db.executemany(
+                    "DELETE FROM details WHERE detailId = ?",
+                    [(i,) for i in outages["detailId"]],
+                )
+                db.executemany(
+                    f"INSERT INTO details "
+                    f"({', '.join(self.__detail_columns)}) VALUES "
+                    f"({', '.join('?' * len(self.__detail_columns))})",
+                    self.__rows(df, self.__detail_columns),
+                )
+            if self.session is not None:
+                db.executemany(
+                    "INSERT OR IGNORE INTO sessions VALUES (?, ?)",
+                    [(self.session, i) for i in outages["detailId"]],
+                )
+            db.execute("COMMIT")
+
+    def read_table(self):
+        """
+        Returns the outages of session, every stored outage without a
+        session, or None when there is none
+        """
+        sql = "SELECT * FROM outages"
+        params = []
+        if self.session is not None:
+            sql += (
+                " WHERE detailId IN "
+                "(SELECT detailId FROM sessions WHERE session = ?)"
+            )
+            params.append(self.session)
+        with self.__connect() as db:
+            df = pd.read_sql_query(sql, db, params=params)
+        if df.empty:
+            return None
+        return df
+
+    def write_curve(self, detail_id, df):
+        """
+        Replaces the time series of detail_id, returns the detailIds whose
+        time series are now on disk
+        """
+        curve = pd.DataFrame(
+            {
+                "detailId": str(detail_id),
+                "intervalStart": self.__utc_text(df["interval start"]).values,
+                "intervalEnd": self.__utc_text(df["interval end"]).values,
+                "newNTC": df["newNTC"].values,
+            }
+        )
+        with self.__connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "DELETE FROM curves WHERE detailId = ?", (str(detail_id),)
+            )
+            db.executemany(
+                "INSERT INTO curves VALUES (?, ?, ?, ?)",
+                self.__rows(curve, curve.columns),
+            )
+            db.execute("COMMIT")
+        return [detail_id]
+
+    def flush(self):
+        return []
+
+    def outages(
+        self,
+        in_area=None,
+        out_area=None,
+        nature=None,
+        status=None,
+        start=None,
+        end=None,
+    ):
+        """
+        Returns the outages matching every given filter, start / end keep
+        the outages overlapping that window (UTC unless the dates say
+        otherwise)
+        """
+        where = []
+        params = []
+        for column, value in (
+            ("inArea", in_area),
+            ("outArea", out_area),
+            ("nature", nature),
+            ("status", status),
+        ):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if end is not None:
+            where.append("unavailabilityStartUTC < ?")
+            params.append(self.__utc_text([end])[0])
+        if start is not None:
+            where.append("unavailabilityEndUTC > ?")
+            params.append(self.__utc_text([start])[0])
+
+        sql = "SELECT * FROM outages"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self.__connect() as db:
+            return pd.read_sql_query(sql, db, params=params)
+
+    def details(self, detail_id):
+        """
+        Returns the affected assets of detail_id
+        """
+        with self.__connect() as db:
+            return pd.read_sql_query(
+                "SELECT * FROM details WHERE detailId = ?",
+                db,
+                params=(str(detail_id),),
+            )
+
+    def curve(self, detail_id, start=None, end=None):
+        """
+        Returns the time series of detail_id like EntsoeAPI.curve_to_df,
+        intervals starting from start up to end only if given
+        """
+        sql = (
+            "SELECT intervalStart, intervalEnd, newNTC FROM curves "
+            "WHERE detailId = ?"
+        )
+        params = [str(detail_id)]
+        if start is not None:
+            sql += " AND intervalStart >= ?"
+            params.append(self.__utc_text([start])[0])
+        if end is not None:
+            sql += " AND intervalStart < ?"
+            params.append(self.__utc_text([end])[0])
+
+        with self.__connect() as db:
+            df = pd.read_sql_query(
+                sql + " ORDER BY intervalStart", db, params=params
+            )
+        df.columns = ["interval start", "interval end", "newNTC"]
+        for column in ("interval start", "interval end"):
+            df[column] = EntsoeAPI.to_utc(df[column], "UTC")
+        df["newNTC"] = pd.to_numeric(df["newNTC"], downcast="float")
+        return df
+
+    def read_curve(self, detail_id):
+        """
+        Returns the whole time series of detail_id, KeyError when there is
+        none
+        """
+        df = self.curve(detail_id)
+        if df.empty:
+            raise KeyError(detail_id)
+        return df
+
+    def iter_curves(self, detail_ids, chunk_size=500):
+        """
+        Yields (detailId, time series) of the detail_ids that have one,
+        chunk_size curves are read and converted per query
+        """
+        detail_ids = [str(i) for i in detail_ids]
+        columns = ["interval start", "interval end", "newNTC"]
+        for i in range(0, len(detail_ids), chunk_size):
+            chunk = detail_ids[i : i + chunk_size]
+            sql = (
+                "SELECT detailId, intervalStart, intervalEnd, newNTC "
+                "FROM curves WHERE detailId IN "
+                f"({', '.join('?' * len(chunk))}) "
+                "ORDER BY detailId, intervalStart"
+            )
+            with self.__connect() as db:
+                df = pd.read_sql_query(sql, db, params=chunk)
+            df.columns = ["detailId"] + columns
+            for column in ("interval start", "interval end"):
+                df[column] = EntsoeAPI.to_utc(df[column], "UTC")
+            df["newNTC"] = pd.to_numeric(df["newNTC"], downcast="float")
+            for detail_id, curve in df.groupby("detailId", sort=False):
+                yield detail_id, curve[columns].reset_index(drop=True)
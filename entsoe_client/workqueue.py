@@ -0,0 +1,160 @@
+import contextlib
+import sqlite3
+import time
+
+
+class WorkQueue(object):
+    """
+    Lease based work queue of [detailId, start, end] jobs kept in SQLite,
+    shared by worker processes of a supervised session
+
+    A leased job is invisible to other workers until the lease expires,
+    jobs of workers that died without finishing them are handed out again
+
+    Jobs belong to a session (the name_format of main.py), workers only
+    lease jobs of their own session so sessions can share a queue file.
+    session=None is every session, for the supervisor's stats and
+    reclaiming leases, put and lease need a session
+    """
+
+    def __init__(self, path, session=None):
+        self.path = path
+        self.session = session
+        with self.__connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS session_jobs ("
+                "session TEXT NOT NULL, "
+                "detailId TEXT NOT NULL, "
+                "unavailabilityStart TEXT, "
+                "unavailabilityEnd TEXT, "
+                "state TEXT NOT NULL DEFAULT 'pending', "
+                "worker TEXT, "
+                "lease_until REAL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "done_at REAL, "
+                "PRIMARY KEY (session, detailId))"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS session_jobs_state "
+                "ON session_jobs (session, state)"
+            )
+
+    def __scoped(self):
+        if self.session is None:
+            raise RuntimeError("work queue jobs need a session")
+        return self.session
+
+    @contextlib.contextmanager
+    def __connect(self):
+        # isolation_level=None, transactions are opened explicitly and
+        # rolled back when the connection closes without a COMMIT
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def put(self, jobs):
+        """
+        Adds [detailId, start, end] jobs, ids already in the queue are
+        left as they are
+        """
+        session = self.__scoped()
+        with self.__connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT OR IGNORE INTO session_jobs "
+                "(session, detailId, unavailabilityStart, unavailabilityEnd) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (session, job[0], str(job[1]), str(job[2]))
+                    for job in jobs
+                ],
+            )
+            db.execute("COMMIT")
+
+    def lease(self, worker, n=1, timeout=1800):
+        """
+        Leases up to n pending jobs to worker for timeout seconds
+        """
+        session = self.__scoped()
+        now = time.time()
+        with self.__connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            self.__reclaim(db, now)
+            jobs = db.execute(
+                "SELECT detailId, unavailabilityStart, unavailabilityEnd "
+                "FROM session_jobs WHERE session = ? AND state = 'pending' "
+                "LIMIT ?",
+                (session, n),
+            ).fetchall()
+            db.executemany(
+                "UPDATE session_jobs SET state = 'leased', worker = ?, "
+                "lease_until = ?, attempts = attempts + 1 "
+                "WHERE session = ? AND detailId = ?",
+                [
+                    (str(worker), now + timeout, session, job[0])
+                    for job in jobs
+                ],
+            )
+            db.execute("COMMIT")
+        return [list(job) for job in jobs]
+
+    def done(self, detail_ids):
+        session = self.__scoped()
+        with self.__connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "UPDATE session_jobs SET state = 'done', worker = NULL, "
+                "lease_until = NULL, done_at = ? "
+                "WHERE session = ? AND detailId = ?",
+                [
+                    (time.time(), session, detail_id)
+                    for detail_id in detail_ids
+                ],
+            )
+            db.execute("COMMIT")
+
+    @staticmethod
+    def __reclaim(db, now):
+        return db.execute(
+            "UPDATE session_jobs SET state = 'pending', worker = NULL, "
+            "lease_until = NULL WHERE state = 'leased' AND lease_until < ?",
+            (now,),
+        ).rowcount
+
+    def reclaim(self):
+        """
+        Returns expired leases to the queue, returns how many
+        """
+        with self.__connect() as db:
+            return self.__reclaim(db, time.time())
+
+    def release(self, worker):
+        """
+        Returns the leases of a dead worker to the queue, returns how many
+        """
+        with self.__connect() as db:
+            return db.execute(
+                "UPDATE session_jobs SET state = 'pending', worker = NULL, "
+                "lease_until = NULL WHERE state = 'leased' "
+                "AND worker = :worker "
+                "AND (:session IS NULL OR session = :session)",
+                {"worker": str(worker), "session": self.session},
+            ).rowcount
+
+    def stats(self):
+        """
+        Returns number of jobs per state
+        """
+        stats = {"pending": 0, "leased": 0, "done": 0}
+        with self.__connect() as db:
+            for state, count in db.execute(
+                "SELECT state, COUNT(*) FROM session_jobs "
+                "WHERE :session IS NULL OR session = :session "
+                "GROUP BY state",
+                {"session": self.session},
+            ):
+                stats[state] = count
+        return stats
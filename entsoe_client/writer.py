@@ -0,0 +1,105 @@
+import logging
+import queue
+import threading
+
+
+class AsyncWriter(object):
+    """
+    Writes the frames of an output (see output.py) on a background thread,
+    download threads hand finished frames over and carry on fetching while
+    they are serialized and written
+
+    At most queue_size frames wait to be written, write_curve blocks when
+    the disk falls behind. detailIds are only reported as persisted once
+    the wrapped output has them on disk, flush waits for every frame
+    handed over so far
+    """
+
+    def __init__(self, output, queue_size=16):
+        self.output = output
+        self.table_path = output.table_path
+        self.__queue = queue.Queue(maxsize=queue_size)
+        self.__persisted = []
+        self.__error = None
+        self.__lock = threading.Lock()
+        self.__thread = threading.Thread(
+            target=self.__run, name="writer", daemon=True
+        )
+        self.__thread.start()
+
+    def __run(self):
+        while True:
+            job = self.__queue.get()
+            try:
+                if job is None:
+                    return
+                if self.__error is not None:
+                    continue  # drop frames after a failed write
+                method, args = job
+                persisted = method(*args)
+                if persisted:
+                    with self.__lock:
+                        self.__persisted.extend(persisted)
+            except Exception as error:
+                logging.exception(error)
+                self.__error = error
+            finally:
+                self.__queue.task_done()
+
+    def __put(self, method, *args):
+        self.__check()
+        self.__queue.put((method, args))
+
+    def __check(self):
+        if self.__error is not None:
+            raise RuntimeError(
+                f"background writer failed: {self.__error}"
+            ) from self.__error
+
+    def __take(self):
+        with self.__lock:
+            persisted, self.__persisted = self.__persisted, []
+        return persisted
+
+    def write_table(self, df):
+        self.__put(self.output.write_table, df)
+
+    def read_table(self):
+        self.flush()
+        return self.output.read_table()
+
+    def read_curve(self, detail_id):
+        self.flush()
+        return self.output.read_curve(detail_id)
+
+    def iter_curves(self, detail_ids):
+        self.flush()
+        return self.output.iter_curves(detail_ids)
+
+    def write_curve(self, detail_id, df):
+        """
+        Queues the time series of detail_id, returns the detailIds written
+        by the background thread since the last call
+        """
+        self.__put(self.output.write_curve, detail_id, df)
+        return self.__take()
+
+    def flush(self):
+        """
+        Waits until every queued frame is on disk, returns the detailIds
+        written since the last call
+        """
+        self.__put(self.output.flush)
+        self.__queue.join()
+        self.__check()
+        return self.__take()
+
+    def close(self):
+        """
+        Flushes and stops the background thread
+        """
+        try:
+            return self.flush()
+        finally:
+            self.__queue.put(None)
+            self.__thread.join()
@@ -3,6 +3,7 @@ import json
 import logging.handlers
 import os
 import sys
+import time
 from timeit import default_timer as timer
 import random
 import datetime
@@ -20,76 +21,130 @@ def human_time(start, end):
     )
 
 
-def start_recovery(name_format):
+def start_recovery(name_format, journal, output):
     logging.info("resuming session starting recovery process")
-    recovery_file_path = os.path.join(data_dir, name_format + ".csv")
-    try:
-        fp = open(recovery_file_path, "r")
-    except FileNotFoundError:
-        logging.info(f"no recovery file found: {recovery_file_path}")
+    df = output.read_table()
+    if df is None:
+        logging.info(f"no recovery file found: {output.table_path}")
         return []
+
+    if "table" in journal.stages:
+        done = journal.curves
     else:
-        # load file names from output dir
-        files = [
-            f
+        # session started before the journal existed, derive ids from
+        # file names once and carry on with the journal from now on
+        logging.info(f"no journal entries found, scanning {data_dir}")
+        done = {
+            f.rsplit("_")[-1].split(".")[0]
             for f in os.listdir(data_dir)
             if os.path.isfile(os.path.join(data_dir, f))
             if name_format + ".csv" not in str(f)
-        ]
-
-        ids = [f.rsplit("_")[-1].split(".")[0] for f in files]
-
-        df = pd.read_csv(fp)
-
-        pending = [
-            [
-                row["detailId"],
-                row["unavailabilityStart"],
-                row["unavailabilityEnd"],
-            ]
-            for (i, row) in df.iterrows()
-            if row["detailId"] not in ids
-        ]
-
-        if len(pending) > 0:
-            random.shuffle(pending)
-            return pending
-        elif len(pending) == 0:
-            logging.info(
-                "session is already completed go grab a cup of coffee !"
-            )
-            sys.exit(0)
+            if not f.endswith(".tmp")
+        }
+        journal.curve_done(*done)
+        journal.stage_done("table")
+
+    df = df.drop_duplicates("detailId")
+    if "unavailabilityStartUTC" not in df:
+        # table written before the utc columns existed, intervals are CET
+        df = entsoe_client.EntsoeAPI.table_to_df(df)
+    columns = ["detailId", "unavailabilityStartUTC", "unavailabilityEndUTC"]
+    pending = df.loc[~df["detailId"].isin(done), columns].values.tolist()
+
+    if len(pending) > 0:
+        random.shuffle(pending)
+        return pending
+    elif len(pending) == 0:
+        logging.info("session is already completed go grab a cup of coffee !")
+        sys.exit(0)
+
+
+class QueueJournal(object):
+    """
+    Session journal of a queue worker, time series on disk are marked done
+    in the work queue as well
+    """
+
+    def __init__(self, journal, queue):
+        self.journal = journal
+        self.queue = queue
+
+    def curve_done(self, *detail_ids):
+        self.journal.curve_done(*detail_ids)
+        self.queue.done(detail_ids)
+
+
+def lease_jobs(queue, worker_id, n, timeout):
+    """
+    Yields jobs leased n at a time from the work queue, one by one, until
+    none is pending
+    """
+    while True:
+        jobs = queue.lease(worker_id, n=n, timeout=timeout)
+        if not jobs:
+            return
+        yield from jobs
+
+
+def consume_queue(
+    client,
+    queue,
+    worker_id,
+    journal,
+    output,
+    from_date,
+    to_date,
+    name_format,
+    data_dir,
+    lease_timeout,
+):
+    """
+    Downloads time series leased from the shared work queue until every
+    job of the session is done, a job is leased whenever a download thread
+    is free
+    """
+    logging.info(f"worker {worker_id} consuming work queue {queue.path}")
+    journal = QueueJournal(journal, queue)
+    while True:
+        client.curve_grid_unavailability_batch(
+            lease_jobs(queue, worker_id, client.workers, lease_timeout),
+            from_date,
+            to_date,
+            name_format=name_format,
+            out_dir=data_dir,
+            journal=journal,
+            output=output,
+        )
+        if queue.stats()["leased"] == 0:
+            break
+        # other workers are still busy, their leases may expire
+        time.sleep(10)
 
 
-def read_from_config_file():
-    CONF_FILE = "config.json"
-    # read config file
+def read_from_config_file(path):
+    """
+    Returns the "session" and "advanced" sections of the config file, both
+    empty when there is no config file
+    """
     try:
-        with open(CONF_FILE, "r") as fp:
+        with open(path, "r") as fp:
             config = json.load(fp)
-    except OSError:
-        print("config file is missing")
+    except FileNotFoundError:
+        return {}, {}
+    except OSError as error:
+        print(f"config file can't be read: \n'{error}'")
         sys.exit(-1)
     except ValueError as error:
         print(f"config file is corrupted check in config file: \n'{error}'")
         sys.exit(-1)
-    else:
-        try:
-            advanced = config["advanced"]
-        except KeyError:
-            advanced = {}
-            session = {}
 
-    # read scrape params - session
-    print(f"reading config file {CONF_FILE}")
-    try:
-        from_date = session.pop("from_date")
-        to_date = session.pop("to_date")
-    except KeyError as error:
-        print(
-            f"error while parsing {CONF_FILE}, required param '{error}' is missing in config file"
-        )
-        sys.exit(-1)
+    print(f"reading config file {path}")
+    session = dict(config.get("session") or {})
+    # session dates of the config file are the defaults of -s / -e
+    for key, dest in (("from_date", "fromDate"), ("to_date", "toDate")):
+        if key in session:
+            session[dest] = session.pop(key)
+    return session, dict(config.get("advanced") or {})
 
 
 if __name__ == "__main__":
@@ -114,6 +169,60 @@ if __name__ == "__main__":
         help="specify area type [BORDER_BZN | BORDER_CTA], defaults: BORDER_BZN",
         default="BORDER_BZN",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="number of concurrent requests, defaults: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--parse-workers",
+        help="parse responses on a pool of processes, defaults: 0 parse "
+        "on the download threads",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--shard-freq",
+        help="split the date range into windows queried independently, "
+        "pandas frequency e.g. MS for monthly, defaults: no split",
+        default=None,
+    )
+    parser.add_argument(
+        "--shard-by",
+        help="split the borders into per [country | border] queries, "
+        "defaults: no split",
+        choices=["country", "border"],
+        default=None,
+    )
+    parser.add_argument(
+        "--queue",
+        help="shared work queue file, without --worker-id the session "
+        "time series are only added to the queue",
+        default=None,
+    )
+    parser.add_argument(
+        "--worker-id",
+        help="download time series leased from the --queue",
+        default=None,
+    )
+    parser.add_argument(
+        "--output",
+        help="output format [csv | dedup | rle | parquet | sqlite], dedup "
+        "stores identical time series once, rle stores runs of constant "
+        "ntc, parquet needs pyarrow, sqlite merges sessions into one "
+        "database, defaults: csv",
+        choices=["csv", "dedup", "rle", "parquet", "sqlite"],
+        default="csv",
+    )
+    parser.add_argument(
+        "--config",
+        help="config file whose session fields are the defaults of the "
+        "command line, without it only the advanced fields of "
+        "config.json are read",
+        default=None,
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -123,10 +232,15 @@ if __name__ == "__main__":
         action="store_true",
     )
 
+    config_path = parser.parse_known_args()[0].config
+    config_session, advanced = read_from_config_file(
+        config_path or "config.json"
+    )
+    if config_path is not None:
+        parser.set_defaults(**config_session)
     args = parser.parse_args()
     session = vars(args)
-    advanced = {}
-
+    session.pop("config")
 
     from_date = session.pop("fromDate", None)
     if from_date is None:
@@ -147,6 +261,13 @@ if __name__ == "__main__":
     asset_type = session.pop("asset_type", None)
     outage_status = session.pop("outage_status", None)
     outage_type = session.pop("outage_type", None)
+    workers = session.pop("workers", 1)
+    parse_workers = session.pop("parse_workers", 0)
+    shard_freq = session.pop("shard_freq", None)
+    shard_by = session.pop("shard_by", None)
+    queue_path = session.pop("queue", None)
+    worker_id = session.pop("worker_id", None)
+    output_format = session.pop("output", "csv")
 
     name_format = (
         f"{country}_{area_type}_{from_date.replace('.', '_')}"
@@ -161,9 +282,30 @@ if __name__ == "__main__":
     backoff_factor = advanced.pop("backoff_factor", 0.5)
     skip_details = advanced.pop("skip_details", False)
     skip_timeseries = advanced.pop("skip_timeseries", False)
-    pause_req = advanced.pop("pause_after_requests", 100)
-    pause_int = advanced.pop("pause_internal", 30)
     conn_rst_int = advanced.pop("connection_reset_interval", 300)
+    rate_mode = advanced.pop("rate_limit_mode", "aimd")
+    rate = advanced.pop("requests_per_second", 1 / req_delay)
+    # faster than the seed rate only when asked for
+    max_rate = advanced.pop("max_requests_per_second", rate)
+    burst = advanced.pop("burst", workers)
+    shard_retries = advanced.pop("shard_retries", 2)
+    lease_timeout = advanced.pop("lease_timeout", 1800)
+    retries = advanced.pop("retries", 5)
+    retry_budget = advanced.pop("retry_budget", 1000)
+    cache_dir = advanced.pop("cache_dir", ".entsoe_cache")
+    cache_ttl = advanced.pop("cache_ttl_days", 30)
+    cache_size = advanced.pop("cache_size_mb", 2048)
+    parquet_compression = advanced.pop("parquet_compression", "zstd")
+    parquet_batch_rows = advanced.pop("parquet_batch_rows", 500000)
+    csv_compression = advanced.pop("csv_compression", None)
+    writer_queue_size = advanced.pop("writer_queue_size", 16)
+    ntc_cube = advanced.pop("ntc_cube", None)
+    store_path = advanced.pop(
+        "store_path", os.path.join(data_dir, "outages.sqlite")
+    )
+    shard_dir = advanced.pop(
+        "shard_dir", os.path.join(data_dir, f"{name_format}_shards")
+    )
 
     try:
         os.mkdir(data_dir)
@@ -193,14 +335,28 @@ if __name__ == "__main__":
 
     logging.info("\n" * 5 + "\t" * 3 + "--" * 10 + "  Session " + "--" * 10)
     t_total = timer()
+    rate_limiter = entsoe_client.RateLimiter(
+        rate=rate, burst=burst, mode=rate_mode, max_rate=max(rate, max_rate)
+    )
+    cache = None
+    if cache_dir:
+        cache = entsoe_client.ResponseCache(
+            cache_dir,
+            ttl=cache_ttl * 24 * 3600 if cache_ttl else None,
+            max_size=cache_size * 1024 * 1024,
+        )
     client = entsoe_client.EntsoeAPI(
         connection=connection,
         backoff_factor=backoff_factor,
         items_per_page=100,
-        pause_req=pause_req,
-        pause_int=pause_int,
         conn_rst_int=conn_rst_int,
-        req_delay=req_delay,
+        workers=workers,
+        parse_workers=parse_workers,
+        rate_limiter=rate_limiter,
+        cache=cache,
+        retry_policy=entsoe_client.RetryPolicy(
+            retries=retries, budget=retry_budget
+        ),
     )
 
     if skip_details:
@@ -210,11 +366,56 @@ if __name__ == "__main__":
         logging.info("skip timeseries download")
 
     exit_code = 0
-    ids_interval = start_recovery(name_format)
+    journal = entsoe_client.SessionJournal(
+        os.path.join(data_dir, f"{name_format}.journal")
+    )
+    if output_format == "parquet":
+        output = entsoe_client.ParquetOutput(
+            data_dir,
+            name_format,
+            batch_rows=parquet_batch_rows,
+            compression=parquet_compression,
+        )
+    elif output_format == "dedup":
+        output = entsoe_client.DedupCsvOutput(data_dir, name_format)
+    elif output_format == "rle":
+        output = entsoe_client.RleOutput(
+            data_dir, name_format, compression=csv_compression
+        )
+    elif output_format == "sqlite":
+        output = entsoe_client.OutageStore(store_path, session=name_format)
+    else:
+        output = entsoe_client.CsvOutput(
+            data_dir, name_format, compression=csv_compression
+        )
+    # files are written on a background thread while downloads go on
+    output = entsoe_client.AsyncWriter(output, queue_size=writer_queue_size)
+    queue = None
+    if queue_path is not None:
+        # workers only lease the jobs of this session
+        queue = entsoe_client.WorkQueue(queue_path, session=name_format)
+
+    ids_interval = []
+    if worker_id is None:
+        ids_interval = start_recovery(name_format, journal, output)
 
     try:
+        if worker_id is not None:
+            consume_queue(
+                client,
+                queue,
+                worker_id,
+                journal,
+                output,
+                from_date,
+                to_date,
+                name_format,
+                data_dir,
+                lease_timeout,
+            )
+
         # no recovery file found start from the beginning
-        if not ids_interval:
+        elif not ids_interval:
             # fetch data
             data = client.transmission_grid_unavailability(
                 from_date=from_date,
@@ -224,13 +425,26 @@ if __name__ == "__main__":
                 outage_type=outage_type,
                 asset_type=asset_type,
                 outage_status=outage_status,
+                shard_freq=shard_freq,
+                shard_by=shard_by,
+                shard_retries=shard_retries,
+                shard_dir=shard_dir,
             )
-            data_df = pd.DataFrame(data)
+            data_df = client.table_to_df(data)
 
             if not skip_details:
                 # fetch details for data
                 ids = [d["detailId"] for d in data]
-                details = client.details_grid_unavailability_batch(ids)
+                # live outages change, only cache the finished ones
+                finished = set()
+                if not data_df.empty:
+                    ended = data_df["unavailabilityEndUTC"] < pd.Timestamp.now(
+                        "UTC"
+                    )
+                    finished = set(data_df.loc[ended, "detailId"])
+                details = client.details_grid_unavailability_batch(
+                    ids, finished=finished
+                )
                 details_df = pd.DataFrame(details)
 
                 data_df = pd.merge(
@@ -239,29 +453,42 @@ if __name__ == "__main__":
                 # merge data and detail into a single data frame and output as csv
                 # data = [{**dat, **det} for dat, det in zip(data, details)]
 
-            data_df.to_csv(
-                os.path.join(data_dir, f"{name_format}.csv"),
-                header=data_df.columns, index=False
-            )
+            output.write_table(data_df)
+            output.flush()
+            journal.stage_done("table")
 
             # download time series data
-            ids_interval = [
-                [
-                    row["detailId"],
-                    row["unavailabilityStart"],
-                    row["unavailabilityEnd"],
-                ]
-                for row in data
+            columns = [
+                "detailId",
+                "unavailabilityStartUTC",
+                "unavailabilityEndUTC",
             ]
+            ids_interval = []
+            if not data_df.empty:
+                ids_interval = (
+                    data_df.drop_duplicates("detailId")
+                    .loc[:, columns]
+                    .values.tolist()
+                )
 
-        if not skip_timeseries:
+        if queue is not None and worker_id is None:
+            # supervised workers download them
+            queue.put(ids_interval)
+            logging.info(f"{len(ids_interval)} time series added to queue")
+        elif worker_id is None and not skip_timeseries:
             client.curve_grid_unavailability_batch(
                 ids_interval,
                 from_date,
                 to_date,
                 name_format=name_format,
                 out_dir=data_dir,
+                journal=journal,
+                output=output,
             )
+            if ntc_cube:
+                cube = entsoe_client.NtcCube(ntc_cube)
+                folded = cube.fold_output(output.read_table(), output)
+                logging.info(f"{folded} time series folded into {ntc_cube}")
 
     except KeyboardInterrupt:
         logging.info("session terminated by user")
@@ -274,6 +501,19 @@ if __name__ == "__main__":
         print("Done.")
         exit_code = 0
     finally:
-        time = human_time(t_total, timer())
-        logging.info(f"requests: {client.requests_num} | time:{time}")
+        try:
+            output.close()
+        except Exception as error:
+            logging.exception(error)
+            exit_code = -1
+        journal.close()
+        t_session = human_time(t_total, timer())
+        logging.info(
+            f"requests: {client.requests_num} | "
+            f"retries: {client.retry_policy.retried} | time:{t_session}"
+        )
+        if cache is not None:
+            logging.info(
+                f"cache hits: {cache.hits} | misses: {cache.misses}"
+            )
         sys.exit(exit_code)
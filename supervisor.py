@@ -3,6 +3,10 @@
 """
  Dead simple supervisor for python scripts to ensure
  script terminated normally and got the job done.
+
+ With -w N the script is run once to fill a shared work queue and then N
+ worker processes download the queued time series, a crashed worker is
+ restarted and its leased jobs go back to the queue.
 """
 
 import subprocess
@@ -12,6 +16,7 @@ import os
 import timeit
 
 RETRY_INTERVAL = 30  # wait seconds before running again after crashing
+REPORT_INTERVAL = 10  # seconds between worker health checks and reports
 
 
 def human_time(start, end):
@@ -52,19 +57,18 @@ def main(super_args):
                 )
             except subprocess.CalledProcessError as error:
                 # print error message when script fails
+                crashes += 1
                 print(
-                    f"{python_script} crashed: {error} \n"
+                    f"{python_script} crashed ({crashes} so far): {error} \n"
                     f"{python_script} will start again in {RETRY_INTERVAL}"
                     f" seconds"
                 )
 
-                crashes += crashes
-
                 time.sleep(RETRY_INTERVAL)
                 continue
             except KeyboardInterrupt:
                 print("received SIGINT supervisor is going to quit now")
-                break
+                return False
 
             # print some stats about the script
             t_end = timeit.default_timer()
@@ -73,7 +77,7 @@ def main(super_args):
                 f"crashed {crashes} times until completion "
                 f"took {human_time(t_start, t_end)} of time"
             )
-            break
+            return True
     else:
         # error message for invalid input file
         sys.exit(
@@ -84,8 +88,101 @@ def main(super_args):
         )
 
 
+def supervise_workers(workers, queue_path, super_args):
+    """
+    fill the work queue with the script, then keep workers processes
+    running until the queue is drained
+    """
+    from entsoe_client.workqueue import WorkQueue
+
+    python_script = super_args[0]
+    args = [*super_args[1:], "--queue", queue_path]
+
+    # enqueue the time series of the session
+    if not main([python_script, *args]):
+        return
+
+    def spawn(worker_id):
+        print(f"starting {worker_id}")
+        return subprocess.Popen(
+            ["python", python_script, *args, "--worker-id", worker_id]
+        )
+
+    queue = WorkQueue(queue_path)
+    names = [f"worker-{i}" for i in range(workers)]
+    procs = {name: spawn(name) for name in names}
+    restart_at = {}
+    crashes = 0
+    t_start = timeit.default_timer()
+    done_start = queue.stats()["done"]
+
+    try:
+        while procs or restart_at:
+            time.sleep(REPORT_INTERVAL)
+
+            for name, proc in list(procs.items()):
+                return_code = proc.poll()
+                if return_code is None:
+                    continue
+                del procs[name]
+                if return_code != 0:
+                    crashes += 1
+                    released = queue.release(name)
+                    print(
+                        f"{name} crashed code: {return_code} ({crashes} "
+                        f"crashes so far), {released} jobs back to queue, "
+                        f"{name} will start again in {RETRY_INTERVAL} seconds"
+                    )
+                    restart_at[name] = timeit.default_timer() + RETRY_INTERVAL
+
+            for name, t_restart in list(restart_at.items()):
+                if timeit.default_timer() >= t_restart:
+                    del restart_at[name]
+                    procs[name] = spawn(name)
+
+            queue.reclaim()
+            stats = queue.stats()
+            elapsed = timeit.default_timer() - t_start
+            rate = 3600 * (stats["done"] - done_start) / elapsed
+            print(
+                f"workers: {len(procs)} | pending: {stats['pending']} "
+                f"leased: {stats['leased']} done: {stats['done']} | "
+                f"{rate:.0f} series/hour"
+            )
+    except KeyboardInterrupt:
+        print("received SIGINT supervisor is going to quit now")
+        for proc in procs.values():
+            proc.terminate()
+        return
+
+    print(
+        f"work queue drained, workers crashed {crashes} times, "
+        f"took {human_time(t_start, timeit.default_timer())} of time"
+    )
+
+
 if __name__ == "__main__":
-    if len(sys.argv[1:]) is 0 or sys.argv[1] in "-h":
-        print("usage: supervisor.py [-h] script [args [args ...]]")
+    usage = (
+        "usage: supervisor.py [-h] [-w workers] [-q queue] "
+        "script [args [args ...]]"
+    )
+    argv = sys.argv[1:]
+    if len(argv) == 0 or argv[0] == "-h":
+        print(usage)
         sys.exit(0)
-    main([sys.argv[1], *sys.argv[2:]])
+
+    workers = 0
+    queue_path = "work_queue.sqlite"
+    while argv and argv[0] in ("-w", "-q"):
+        if len(argv) < 2:
+            sys.exit(usage)
+        if argv[0] == "-w":
+            workers = int(argv[1])
+        else:
+            queue_path = argv[1]
+        argv = argv[2:]
+
+    if workers > 0:
+        supervise_workers(workers, queue_path, argv)
+    else:
+        main(argv)
@@ -0,0 +1,65 @@
+import os
+import zipfile
+
+import pandas as pd
+import pytest
+
+from entsoe_client import EntsoeAPI
+
+ARCHIVE = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "data",
+    "SK_BORDER_BZN_01_01_2018_01_01_2020.zip",
+)
+# recorded curve covering 28.10.2018, the server labels both repeated
+# hours "02:00 - 03:00" when dst ends
+DETAIL_ID = "5bd6b14b3991bdf2bfe914e7"
+
+
+@pytest.fixture(scope="module")
+def data():
+    """
+    getDetailCurve/ aaData rows of DETAIL_ID
+    """
+    name = os.path.basename(ARCHIVE)[:-4]
+    with zipfile.ZipFile(ARCHIVE) as archive:
+        with archive.open(f"{name}/{name}_{DETAIL_ID}.csv") as fp:
+            df = pd.read_csv(fp, index_col=0, dtype=str)
+    return [
+        [f"{start} - {end}", ntc]
+        for start, end, ntc in df[
+            ["interval start", "interval end", "newNTC"]
+        ].values.tolist()
+    ]
+
+
+def test_intervals_are_hourly_and_consecutive(data):
+    df = EntsoeAPI.curve_to_df(data)
+    starts = df["interval start"]
+    ends = df["interval end"]
+
+    assert ((ends - starts) == pd.Timedelta("1h")).all()
+    assert (starts.iloc[1:].values == ends.iloc[:-1].values).all()
+
+
+def test_repeated_hour_when_dst_ends(data):
+    repeated = [
+        i
+        for i, row in enumerate(data)
+        if row[0].startswith("28.10.2018 02:00")
+    ]
+    assert len(repeated) == 2
+
+    df = EntsoeAPI.curve_to_df(data)
+    starts = df["interval start"].iloc[repeated]
+    assert starts.dt.strftime("%Y-%m-%d %H:%M").tolist() == [
+        "2018-10-28 00:00",
+        "2018-10-28 01:00",
+    ]
+
+
+def test_empty_curve():
+    df = EntsoeAPI.curve_to_df([])
+    assert df.empty
+    assert list(df.columns) == ["interval start", "interval end", "newNTC"]
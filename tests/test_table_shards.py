@@ -0,0 +1,79 @@
+import pytest
+
+from entsoe_client import EntsoeAPI
+
+
+class FlakyTable(object):
+    """
+    getDataTableData/ stub, 200 outages per monthly shard in pages of 100,
+    the second page of the first shard fails once
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.failed = False
+
+    def __call__(self, method, params=(), data=None, raw=False, cache=True):
+        window = dict(params)["dateTime.dateTime"][:10]
+        offset = data["iDisplayStart"]
+        self.calls.append((window, offset))
+        if offset == 100 and not self.failed:
+            self.failed = True
+            raise ConnectionError("connection reset")
+
+        rows = [
+            [
+                "A05",
+                "A54",
+                "01.01.2018 00:00&nbsp;-&nbsp;02.01.2018 00:00 (CET)",
+                "BZN|CZ",
+                "BZN|SK",
+                "500",
+                f"{window}-{offset + i}",
+            ]
+            for i in range(data["iDisplayLength"])
+        ]
+        return {"iTotalRecords": 200, "aaData": rows}
+
+
+@pytest.fixture
+def client():
+    client = EntsoeAPI(items_per_page=100)
+    yield client
+    client.close()
+
+
+def test_failed_shard_is_fetched_again_in_full(client):
+    table = FlakyTable()
+    client.api_call = table
+
+    rows = client.transmission_grid_unavailability(
+        from_date="01.01.2018",
+        to_date="01.03.2018",
+        area_type="BORDER_BZN",
+        country="SK",
+        shard_freq="MS",
+        shard_retries=2,
+    )
+
+    assert table.failed
+    # first shard: page 1, failed page 2, then both pages again
+    assert len(table.calls) == 6
+    assert len(rows) == 400
+    assert len({row["detailId"] for row in rows}) == 400
+
+
+def test_shard_fails_once_retries_are_spent(client):
+    def broken(method, params=(), data=None, raw=False, cache=True):
+        raise ConnectionError("connection reset")
+
+    client.api_call = broken
+    with pytest.raises(ConnectionError):
+        client.transmission_grid_unavailability(
+            from_date="01.01.2018",
+            to_date="01.03.2018",
+            area_type="BORDER_BZN",
+            country="SK",
+            shard_freq="MS",
+            shard_retries=1,
+        )
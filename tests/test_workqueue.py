@@ -0,0 +1,40 @@
+import pytest
+
+from entsoe_client import WorkQueue
+
+
+def jobs(*detail_ids):
+    return [[i, "2018-01-01 00:00", "2018-01-02 00:00"] for i in detail_ids]
+
+
+def test_sessions_sharing_a_queue_file_keep_their_jobs(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    a = WorkQueue(path, session="A")
+    b = WorkQueue(path, session="B")
+    a.put(jobs("1", "2", "3"))
+    b.put(jobs("3", "4"))
+
+    leased = b.lease("worker-0", n=10)
+    assert sorted(job[0] for job in leased) == ["3", "4"]
+    b.done(["3", "4"])
+
+    # B finishing detailId 3 doesn't touch the job of A
+    assert a.stats() == {"pending": 3, "leased": 0, "done": 0}
+    assert b.stats() == {"pending": 0, "leased": 0, "done": 2}
+    assert WorkQueue(path).stats() == {"pending": 3, "leased": 0, "done": 2}
+
+
+def test_release_returns_leases_of_every_session(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    a = WorkQueue(path, session="A")
+    a.put(jobs("1", "2"))
+    a.lease("worker-0", n=2)
+
+    assert WorkQueue(path).release("worker-0") == 2
+    assert a.stats()["pending"] == 2
+
+
+def test_jobs_need_a_session(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+    with pytest.raises(RuntimeError):
+        queue.put(jobs("1"))